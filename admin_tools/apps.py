@@ -9,3 +9,6 @@ class AdminToolsConfig(AppConfig):
         super(AdminToolsConfig, self).ready()
         # load admin_tools checks
         from . import checks
+        # invalidate cached permissions when they change
+        from .cache import connect_signals
+        connect_signals()
@@ -0,0 +1,90 @@
+"""
+Asynchronous initialization of dashboard modules and menu items.
+
+This module uses the ``async``/``await`` syntax and is only imported when
+the ``ADMIN_TOOLS_ASYNC_INIT`` setting is set.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+
+async def run_in_thread(func, context, thread_safe=False):
+    """
+    Calls the synchronous ``func(context)`` from the event loop. Functions
+    that are not ``thread_safe`` run one after the other in the thread of
+    the request, the others in a thread of their own.
+    """
+    await sync_to_async(func, thread_sensitive=not thread_safe)(context)
+
+
+async def ainit_recent_actions(module, context):
+    """
+    ``RecentActions.ainit_with_context`` implementation, the log entries
+    are fetched with the asynchronous queryset API when available.
+    """
+    from django.conf import settings
+
+    if module._initialized:
+        return
+    if getattr(settings, 'ADMIN_TOOLS_RECENT_ACTIONS_CACHE_SIZE', None):
+        children = await sync_to_async(module._get_cached_children)(context)
+        if children is not None:
+            module._set_children(children)
+            return
+    # the content type ids of the filters may be fetched from the database
+    qs = await sync_to_async(module._get_queryset)(context)
+    if hasattr(qs, 'aiterator'):
+        children = [entry async for entry in qs]
+    else:
+        children = await sync_to_async(list)(qs)
+    module._set_children(children)
+
+
+async def _ainit_module(module, context):
+    from admin_tools.dashboard.utils import _copy_module, _set_unavailable
+
+    # like in worker threads, the module is initialized on a copy so that
+    # an initialization that times out cannot alter the rendered module
+    clone = _copy_module(module)
+    try:
+        await asyncio.wait_for(
+            clone.ainit_with_context(context.new(context.flatten())),
+            module.init_timeout
+        )
+    except Exception:
+        _set_unavailable(module)
+    else:
+        module.__dict__.update(clone.__dict__)
+    module._initialized = True
+
+
+async def ainit_modules(modules, context):
+    """
+    Initializes the given dashboard ``modules`` concurrently.
+    """
+    await asyncio.gather(
+        *[_ainit_module(module, context) for module in modules]
+    )
+
+
+def _get_menu_items(items):
+    for item in items:
+        yield item
+        for child in _get_menu_items(item.children):
+            yield child
+
+
+async def _ainit_menu_item(item, context):
+    await item.ainit_with_context(context)
+    item._initialized = True
+
+
+async def ainit_menu_items(items, context):
+    """
+    Initializes the given menu ``items`` and their children concurrently.
+    """
+    await asyncio.gather(*[
+        _ainit_menu_item(item, context)
+        for item in _get_menu_items(items) if not item._initialized
+    ])
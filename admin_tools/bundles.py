@@ -0,0 +1,210 @@
+"""
+Static asset bundles.
+
+The ``bundle_admin_tools`` management command concatenates the javascript
+files of the menu and of the dashboards (including the files listed in
+their ``Media`` classes) into a single bundle, named after the hash of its
+content and saved in the static files storage along with a manifest. When
+the ``ADMIN_TOOLS_BUNDLE`` setting is set and the bundle has been built,
+the templates load it with a ``defer`` script tag instead of loading the
+files one after the other.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.templatetags.static import static
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+from admin_tools.utils import get_request_cache, import_class
+
+MANIFEST_NAME = 'admin_tools/bundles/manifest.json'
+
+JQUERY_UI = 'admin_tools/js/jquery/jquery-ui.min.js'
+
+# polyfills that are not loaded with the modern asset profile
+LEGACY_FILES = (
+    'admin_tools/js/json.min.js',
+    'admin_tools/js/jquery/jquery.cookie.min.js',
+)
+
+# the bundled files, with the javascript condition under which they are
+# executed (like the tests of the sequential loader)
+BUNDLE_FILES = (
+    ('admin_tools/js/jquery/jquery.min.js', "typeof(jQuery) == 'undefined'"),
+    (JQUERY_UI, "typeof(jQuery.ui) == 'undefined'"),
+    ('admin_tools/js/json.min.js', "typeof(JSON.stringify) == 'undefined'"),
+    ('admin_tools/js/jquery/jquery.cookie.min.js',
+     "typeof(jQuery.cookie) == 'undefined'"),
+    ('admin_tools/js/jquery/jquery.dashboard.js', None),
+    ('admin_tools/js/dashboard.js', None),
+    ('admin_tools/js/menu.js', None),
+)
+
+_manifest = {}
+
+
+@receiver(setting_changed)
+def _clear_manifest(setting, **kwargs):
+    if setting in ('ADMIN_TOOLS_BUNDLE', 'STATIC_ROOT', 'STATIC_URL',
+                   'ADMIN_TOOLS_ASSET_PROFILE'):
+        _manifest.clear()
+
+
+def use_modern_assets():
+    """
+    Returns ``True`` if the ``ADMIN_TOOLS_ASSET_PROFILE`` setting is
+    ``'modern'``: the legacy polyfills and the Internet Explorer specific
+    assets are not loaded, and jQuery UI is only loaded when the dashboard
+    needs it.
+    """
+    return getattr(settings, 'ADMIN_TOOLS_ASSET_PROFILE', 'legacy') == \
+        'modern'
+
+
+def _get_asset_profile():
+    return 'modern' if use_modern_assets() else 'legacy'
+
+
+def _get_class_paths(setting, default):
+    value = getattr(settings, setting, default)
+    if isinstance(value, dict):
+        return list(value.values())
+    return [value]
+
+
+def get_media_files():
+    """
+    Returns the javascript files listed in the ``Media`` classes of the
+    configured menus and dashboards, and of the registered app dashboards.
+    """
+    from admin_tools.dashboard.registry import Registry
+
+    paths = _get_class_paths(
+        'ADMIN_TOOLS_MENU', 'admin_tools.menu.DefaultMenu'
+    ) + _get_class_paths(
+        'ADMIN_TOOLS_INDEX_DASHBOARD',
+        'admin_tools.dashboard.dashboards.DefaultIndexDashboard'
+    ) + _get_class_paths(
+        'ADMIN_TOOLS_APP_INDEX_DASHBOARD',
+        'admin_tools.dashboard.dashboards.DefaultAppIndexDashboard'
+    )
+    classes = [import_class(path) for path in paths]
+    classes += list(Registry.registry.values())
+    files = []
+    for cls in classes:
+        for js in cls.Media.js:
+            if js not in files:
+                files.append(js)
+    return files
+
+
+def _read(path):
+    found = finders.find(path)
+    if found is None:
+        return None
+    with open(found, 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def build_bundle():
+    """
+    Builds the bundle and saves it in the static files storage with its
+    manifest, returns the manifest (a dict with the ``name`` of the bundle,
+    the list of the bundled ``files`` and the asset ``profile`` it was
+    built for).
+    """
+    files = []
+    parts = []
+    sources = list(BUNDLE_FILES)
+    if use_modern_assets():
+        # jQuery UI is loaded separately when the dashboard needs it
+        sources = [
+            (path, condition) for path, condition in sources
+            if path not in LEGACY_FILES and path != JQUERY_UI
+        ]
+    sources += [(js, None) for js in get_media_files()]
+    for path, condition in sources:
+        source = _read(path)
+        if source is None:
+            # loaded separately by the templates
+            continue
+        if rjsmin is not None and not path.endswith('.min.js'):
+            source = rjsmin.jsmin(source)
+        if condition is not None:
+            source = 'if (%s) {\n%s\n}' % (condition, source)
+        # the semicolon terminates files that do not end with one
+        parts.append('/* %s */\n%s\n;' % (path, source))
+        files.append(path)
+    content = '\n'.join(parts).encode('utf-8')
+    name = 'admin_tools/bundles/admin_tools.%s.js' % (
+        hashlib.md5(content).hexdigest()[:12]
+    )
+    if not staticfiles_storage.exists(name):
+        staticfiles_storage.save(name, ContentFile(content))
+    manifest = {
+        'name': name, 'files': files, 'profile': _get_asset_profile()
+    }
+    if staticfiles_storage.exists(MANIFEST_NAME):
+        staticfiles_storage.delete(MANIFEST_NAME)
+    staticfiles_storage.save(
+        MANIFEST_NAME, ContentFile(json.dumps(manifest).encode('utf-8'))
+    )
+    _manifest.clear()
+    return manifest
+
+
+def get_manifest():
+    """
+    Returns the manifest of the bundle, or ``None`` if it was not built.
+    The manifest is read once per process.
+    """
+    if 'manifest' not in _manifest:
+        try:
+            with staticfiles_storage.open(MANIFEST_NAME) as f:
+                manifest = json.loads(f.read().decode('utf-8'))
+        except (IOError, OSError, ValueError):
+            manifest = None
+        _manifest['manifest'] = manifest
+    return _manifest['manifest']
+
+
+def _get_bundle_url(name):
+    try:
+        return staticfiles_storage.url(name)
+    except ValueError:
+        # the bundle is not in the manifest of a manifest storage, its name
+        # is already hashed
+        return settings.STATIC_URL + name
+
+
+def get_bundle_scripts(request, media_js):
+    """
+    Returns the URLs of the scripts to load with ``defer``: the bundle (the
+    first time it is needed in the request) and the files of ``media_js``
+    that are not bundled. Returns ``None`` if the ``ADMIN_TOOLS_BUNDLE``
+    setting is not set, if the bundle was not built or if it was built for
+    another ``ADMIN_TOOLS_ASSET_PROFILE``, the templates then load the files
+    one after the other.
+    """
+    if not getattr(settings, 'ADMIN_TOOLS_BUNDLE', False):
+        return None
+    manifest = get_manifest()
+    if manifest is None or \
+            manifest.get('profile', 'legacy') != _get_asset_profile():
+        return None
+    scripts = []
+    request_cache = get_request_cache(request)
+    if not request_cache.get('bundle_loaded'):
+        request_cache['bundle_loaded'] = True
+        scripts.append(_get_bundle_url(manifest['name']))
+    scripts += [static(js) for js in media_js if js not in manifest['files']]
+    return scripts
@@ -0,0 +1,136 @@
+"""
+Cache utilities shared by the admin tools apps.
+
+Cached values are stored in the cache backend named by the
+``ADMIN_TOOLS_CACHE`` setting (``'default'`` if not set). Invalidation
+relies on version stamps: a cached value key embeds the version of the
+namespaces it depends on, bumping a namespace version makes all the keys
+built with the previous version unreachable.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+
+def get_cache():
+    """
+    Returns the cache backend used by admin tools.
+    """
+    return caches[getattr(settings, 'ADMIN_TOOLS_CACHE', 'default')]
+
+
+def make_key(prefix, *parts):
+    """
+    Returns a cache key safe for every backend (no spaces, bounded length)
+    for the given ``prefix`` and variable ``parts``.
+    """
+    digest = hashlib.md5(
+        '|'.join(str(part) for part in parts).encode('utf-8')
+    ).hexdigest()
+    return 'admin_tools:%s:%s' % (prefix, digest)
+
+
+def _version_key(namespace):
+    return 'admin_tools:version:%s' % namespace
+
+
+def get_versions(*namespaces):
+    """
+    Returns the current version stamps of the given namespaces, namespaces
+    without version (never bumped or evicted) get a fresh one.
+    """
+    cache = get_cache()
+    keys = [_version_key(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in versions:
+            # a random stamp never collides with a stamp used before the
+            # version was evicted
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+        result.append(versions[key])
+    return result
+
+
+def bump_version(*namespaces):
+    """
+    Invalidates every cached value depending on the given namespaces.
+    """
+    get_cache().set_many(
+        dict((_version_key(ns), uuid.uuid4().hex) for ns in namespaces),
+        None
+    )
+
+
+def get_permissions_version(user):
+    """
+    Returns a string identifying the current state of ``user`` permissions:
+    it changes whenever the user, its groups or its permissions change.
+    """
+    global_version, user_version = get_versions(
+        'permissions', 'permissions:%s' % user.pk
+    )
+    return '%s.%s.%d%d%d' % (
+        global_version,
+        user_version,
+        user.is_active,
+        user.is_staff,
+        user.is_superuser,
+    )
+
+
+def _user_changed(sender, instance, **kwargs):
+    bump_version('permissions:%s' % instance.pk)
+
+
+def _permissions_changed(sender, instance, action, model, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    user_model = get_user_model()
+    if isinstance(instance, user_model):
+        bump_version('permissions:%s' % instance.pk)
+    elif model is user_model and pk_set:
+        bump_version(*['permissions:%s' % pk for pk in pk_set])
+    else:
+        # group permissions changed or relations cleared from the
+        # permission/group side: every user may be affected
+        bump_version('permissions')
+
+
+def _all_permissions_changed(sender, **kwargs):
+    bump_version('permissions')
+
+
+def connect_signals():
+    """
+    Connects the signal handlers bumping the permissions version.
+    """
+    from django.contrib.auth.models import Group, Permission
+
+    user_model = get_user_model()
+    post_save.connect(
+        _user_changed, sender=user_model,
+        dispatch_uid='admin_tools.cache.user_changed'
+    )
+    for through in (
+        getattr(user_model, 'groups', None),
+        getattr(user_model, 'user_permissions', None),
+        Group.permissions,
+    ):
+        if through is None:
+            # custom user model without groups or permissions
+            continue
+        m2m_changed.connect(
+            _permissions_changed, sender=through.through,
+            dispatch_uid='admin_tools.cache.%s' % through.through.__name__
+        )
+    for model in (Group, Permission):
+        post_delete.connect(
+            _all_permissions_changed, sender=model,
+            dispatch_uid='admin_tools.cache.%s_deleted' % model.__name__
+        )
@@ -5,3 +5,9 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'admin_tools.dashboard'
+
+    def ready(self):
+        super(DashboardConfig, self).ready()
+        # invalidate cached preferences when they change
+        from .utils import connect_signals
+        connect_signals()
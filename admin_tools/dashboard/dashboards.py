@@ -3,7 +3,6 @@ Module where admin tools dashboard classes are defined.
 """
 
 from django.template.defaultfilters import slugify
-from importlib import import_module
 try:
     # we use django.urls import as version detection as it will fail on django 1.11 and thus we are safe to use
     # gettext_lazy instead of ugettext_lazy instead
@@ -16,7 +15,7 @@ except ImportError:
     from django.utils.encoding import force_text as force_str
 
 from admin_tools.dashboard import modules
-from admin_tools.utils import get_admin_site_name, uniquify
+from admin_tools.utils import get_admin_site_name, import_class, uniquify
 
 
 class Dashboard(object):
@@ -194,12 +193,7 @@ class AppIndexDashboard(Dashboard):
         """
         Helper method that returns a list of model classes for the current app.
         """
-        models = []
-        for m in self.models:
-            mod, cls = m.rsplit('.', 1)
-            mod = import_module(mod)
-            models.append(getattr(mod, cls))
-        return models
+        return [import_class(m) for m in self.models]
 
     def get_app_content_types(self):
         """
@@ -0,0 +1,159 @@
+"""
+Feed fetching for the ``Feed`` dashboard module.
+
+Parsed feeds are stored in the admin tools cache and served from there, a
+feed older than its refresh interval is still served while a background
+thread revalidates it with a conditional GET (``ETag`` and
+``Last-Modified``). Only the very first fetch of a feed is done while
+rendering, and it is bounded by the module timeout. When a refresh fails
+the stale entries keep being served. When the first fetch fails, the
+failure is stored as well: the next renders do not wait for the feed, it
+is retried in background after ``RETRY_INTERVAL`` seconds.
+"""
+import datetime
+import threading
+import time
+
+try:
+    from urllib.error import HTTPError
+    from urllib.request import Request, urlopen
+except ImportError:
+    from urllib2 import HTTPError, Request, urlopen
+
+from admin_tools.cache import get_cache, make_key
+
+#: Seconds before a feed that could never be fetched is fetched again.
+RETRY_INTERVAL = 60
+
+
+class FeedUnavailable(Exception):
+    """
+    Raised when the feed has never been fetched successfully.
+    """
+
+
+def _get_key(url):
+    return make_key('feed', url)
+
+
+def _fetch(url, timeout, etag=None, modified=None):
+    """
+    Fetches ``url``, returns a ``(body, etag, modified)`` tuple, or ``None``
+    if the feed was not modified.
+    """
+    request = Request(url, headers={'User-Agent': 'django-admin-tools'})
+    if etag:
+        request.add_header('If-None-Match', etag)
+    if modified:
+        request.add_header('If-Modified-Since', modified)
+    try:
+        response = urlopen(request, timeout=timeout)
+    except HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+    try:
+        return (
+            response.read(),
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+        )
+    finally:
+        response.close()
+
+
+def _parse(body):
+    import feedparser
+
+    entries = []
+    for entry in feedparser.parse(body)['entries']:
+        entry = dict(entry, url=entry.get('link'))
+        try:
+            entry['date'] = datetime.date(*entry['published_parsed'][0:3])
+        except:
+            # no date for certain feeds
+            pass
+        entries.append(entry)
+    return entries
+
+
+def refresh_feed(url, timeout=None):
+    """
+    Fetches the feed at ``url`` and stores it in the cache, returns the
+    stored record. If the feed cannot be fetched the previously stored
+    record is kept (and returned). If there is no such record, a failure
+    record (without entries) is stored and the exception is raised.
+    """
+    cache = get_cache()
+    key = _get_key(url)
+    record = cache.get(key)
+    try:
+        if record is None:
+            result = _fetch(url, timeout)
+        else:
+            result = _fetch(url, timeout, record['etag'], record['modified'])
+    except Exception:
+        if record is None or record['entries'] is None:
+            cache.set(key, {
+                'entries': None,
+                'etag': None,
+                'modified': None,
+                'checked': time.time(),
+            }, None)
+            raise
+        # serve the stale entries until the next refresh interval
+        result = None
+    if result is not None:
+        body, etag, modified = result
+        record = {
+            'entries': _parse(body),
+            'etag': etag,
+            'modified': modified,
+        }
+    record['checked'] = time.time()
+    cache.set(key, record, None)
+    return record
+
+
+def _refresh(url, timeout, lock_key):
+    try:
+        refresh_feed(url, timeout)
+    except Exception:
+        pass
+    finally:
+        get_cache().delete(lock_key)
+
+
+def refresh_feed_in_background(url, timeout=None):
+    """
+    Refreshes the feed at ``url`` in a background thread, unless a refresh
+    of this feed is already running. Returns the started thread or
+    ``None``.
+    """
+    lock_key = make_key('feed_lock', url)
+    if not get_cache().add(lock_key, True, (timeout or 60) * 2):
+        return None
+    thread = threading.Thread(target=_refresh, args=(url, timeout, lock_key))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def get_feed_entries(url, refresh_interval, timeout=None):
+    """
+    Returns the entries of the feed at ``url``, fetching the feed only if
+    it was never fetched before and refreshing it in background if it was
+    fetched more than ``refresh_interval`` seconds ago. Raises
+    ``FeedUnavailable`` if the feed could not be fetched so far.
+    """
+    record = get_cache().get(_get_key(url))
+    if record is None:
+        record = refresh_feed(url, timeout)
+    else:
+        if record['entries'] is None:
+            refresh_interval = min(refresh_interval, RETRY_INTERVAL)
+        if time.time() - record['checked'] > refresh_interval:
+            refresh_feed_in_background(url, timeout)
+    if record['entries'] is None:
+        raise FeedUnavailable(url)
+    return record['entries']
@@ -0,0 +1,97 @@
+"""
+Model fields used by the dashboard app.
+"""
+import json
+
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+try:
+    from django.utils.translation import gettext_lazy as _
+except ImportError:
+    from django.utils.translation import ugettext_lazy as _
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+def dumps(value):
+    """
+    Returns the compact JSON representation of ``value``.
+    """
+    return json.dumps(value, separators=(',', ':'), sort_keys=True)
+
+
+class JSONFormField(forms.CharField):
+    widget = forms.Textarea
+
+    def prepare_value(self, value):
+        if value is None or isinstance(value, string_types):
+            return value
+        return dumps(value)
+
+
+class JSONTextField(models.TextField):
+    """
+    A text field storing a JSON object, the Python value is a dict. Values
+    that cannot be parsed when they are read from the database are
+    replaced by an empty dict.
+
+    ``max_size``
+        The maximum length of the stored JSON, values that are larger are
+        not valid. Default value: ``None`` (no limit).
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.max_size = kwargs.pop('max_size', None)
+        super(JSONTextField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(JSONTextField, self).deconstruct()
+        if self.max_size is not None:
+            kwargs['max_size'] = self.max_size
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, *args):
+        if value is None:
+            return value
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return {}
+        return value if isinstance(value, dict) else {}
+
+    def to_python(self, value):
+        if value is None or not isinstance(value, string_types):
+            return value
+        try:
+            return json.loads(value)
+        except ValueError:
+            raise ValidationError(_('Enter valid JSON.'), code='invalid')
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, string_types):
+            return value
+        return dumps(value)
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.value_from_object(obj))
+
+    def validate(self, value, model_instance):
+        super(JSONTextField, self).validate(value, model_instance)
+        if not isinstance(value, dict):
+            raise ValidationError(_('Enter a JSON object.'), code='invalid')
+        if self.max_size is not None and \
+                len(self.get_prep_value(value)) > self.max_size:
+            raise ValidationError(
+                _('Ensure this value has at most %(max_size)d characters.'),
+                code='max_size',
+                params={'max_size': self.max_size},
+            )
+
+    def formfield(self, **kwargs):
+        defaults = {'form_class': JSONFormField}
+        defaults.update(kwargs)
+        return super(JSONTextField, self).formfield(**defaults)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+import admin_tools.dashboard.fields
+import admin_tools.dashboard.utils
+
+
+# frozen copy of admin_tools.dashboard.utils.clean_preferences
+def _is_str(value):
+    try:
+        return isinstance(value, basestring)
+    except NameError:
+        return isinstance(value, str)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_id_map(value):
+    return isinstance(value, dict) and all(
+        isinstance(v, bool) for v in value.values()
+    )
+
+
+PREFERENCES_SCHEMA = {
+    'positions': lambda v: isinstance(v, list) and all(map(_is_str, v)),
+    'columns': lambda v: isinstance(v, list) and all(map(_is_int, v)),
+    'collapsed': _is_id_map,
+    'disabled': _is_id_map,
+}
+
+
+def clean_preferences(preferences):
+    if not isinstance(preferences, dict):
+        return {}
+    return dict(
+        (category, value) for category, value in preferences.items()
+        if category in PREFERENCES_SCHEMA and
+        PREFERENCES_SCHEMA[category](value)
+    )
+
+
+def compact_preferences(apps, schema_editor):
+    """
+    Parses the stored preferences, drops the invalid ones and stores them
+    as compact JSON.
+    """
+    DashboardPreferences = apps.get_model('dashboard', 'DashboardPreferences')
+    field = DashboardPreferences._meta.get_field('data')
+    for pk, data in DashboardPreferences.objects.values_list('pk', 'data'):
+        # data is parsed by the JSONTextField
+        compacted = clean_preferences(data)
+        if len(field.get_prep_value(compacted)) > field.max_size:
+            compacted = {}
+        DashboardPreferences.objects.filter(pk=pk).update(data=compacted)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dashboardpreferences',
+            name='data',
+            field=admin_tools.dashboard.fields.JSONTextField(max_size=16384, validators=[admin_tools.dashboard.utils.validate_preferences]),
+        ),
+        migrations.RunPython(compact_preferences, migrations.RunPython.noop),
+    ]
@@ -8,16 +8,20 @@ from django.db import models
 from admin_tools.deprecate_utils import import_path_is_changed
 from admin_tools.dashboard import dashboards
 from admin_tools.dashboard import modules
+from admin_tools.dashboard.fields import JSONTextField
+from admin_tools.dashboard.utils import validate_preferences
 
 user_model = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 
 
 class DashboardPreferences(models.Model):
     """
-    This model represents the dashboard preferences for a user.
+    This model represents the dashboard preferences for a user, ``data``
+    is a dict validated against
+    :data:`~admin_tools.dashboard.utils.PREFERENCES_SCHEMA`.
     """
     user = models.ForeignKey(user_model, on_delete=models.CASCADE)
-    data = models.TextField()
+    data = JSONTextField(max_size=16384, validators=[validate_preferences])
     dashboard_id = models.CharField(max_length=100)
 
     def __unicode__(self):
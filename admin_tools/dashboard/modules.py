@@ -12,10 +12,20 @@ except ImportError:
     from django.core.urlresolvers import reverse
     from django.utils.translation import ugettext_lazy as _
 from django.forms.utils import flatatt
+from django.utils.translation import get_language
 from django.utils.itercompat import is_iterable
 from django.utils.text import capfirst
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
 
-from admin_tools.utils import AppListElementMixin, uniquify
+from admin_tools.cache import (
+    bump_version, get_permissions_version, get_versions, make_key
+)
+from admin_tools.utils import (
+    AppListElementMixin, get_admin_site_name, uniquify
+)
 
 
 class DashboardModule(object):
@@ -66,6 +76,33 @@ class DashboardModule(object):
     ``template``
         The template to use to render the module.
         Default value: 'admin_tools/dashboard/module.html'.
+
+    ``cache_timeout``
+        If set, the rendered module is cached for this number of seconds
+        and ``init_with_context`` is not called when the module is served
+        from the cache. Default value: ``None`` (no caching).
+
+    ``cache_vary_on``
+        The values the rendered module depends on when it is cached, among
+        'user', 'permissions' (the user permissions), 'language' and 'site'
+        (the admin site). Default value:
+        ``('user', 'permissions', 'language', 'site')``.
+
+    ``lazy``
+        Boolean that determines whether the module is rendered with the
+        dashboard or loaded afterwards by the dashboard javascript, use this
+        for slow modules. Default value: ``False``.
+
+    ``thread_safe``
+        Boolean that determines whether ``init_with_context`` can be called
+        in a worker thread, concurrently with other modules, when the
+        ``ADMIN_TOOLS_DASHBOARD_INIT_WORKERS`` setting is set.
+        Default value: ``False``.
+
+    ``init_timeout``
+        When initialized in a worker thread, the module is displayed as
+        unavailable if its initialization takes more than this number of
+        seconds. Default value: 10.
     """
 
     template = 'admin_tools/dashboard/module.html'
@@ -81,6 +118,11 @@ class DashboardModule(object):
     post_content = None
     children = None
     id = None
+    cache_timeout = None
+    cache_vary_on = ('user', 'permissions', 'language', 'site')
+    lazy = False
+    thread_safe = False
+    init_timeout = 10
 
     def __init__(self, title=None, **kwargs):
         if title is not None:
@@ -131,6 +173,26 @@ class DashboardModule(object):
         """
         pass
 
+    def ainit_with_context(self, context):
+        """
+        Asynchronous counterpart of ``init_with_context``, used instead of it
+        when the ``ADMIN_TOOLS_ASYNC_INIT`` setting is set: the coroutines of
+        all the dashboard modules are awaited concurrently before rendering.
+
+        The default implementation calls ``init_with_context`` in a thread,
+        override it with an ``async def`` method to perform I/O without
+        holding a thread, for example::
+
+            class StatsModule(modules.DashboardModule):
+                async def ainit_with_context(self, context):
+                    async with httpx.AsyncClient() as client:
+                        response = await client.get(STATS_URL)
+                    self.children = response.json()['stats']
+        """
+        from admin_tools.async_utils import run_in_thread
+
+        return run_in_thread(self.init_with_context, context, self.thread_safe)
+
     def is_empty(self):
         """
         Return True if the module has no content and False otherwise.
@@ -182,6 +244,46 @@ class DashboardModule(object):
         ret += self.css_classes
         return ' '.join(ret)
 
+    def get_cache_key(self, context):
+        """
+        Returns the key of the rendered module in the cache, it depends on
+        the module class and id, the dashboard, and the values listed in
+        ``cache_vary_on``.
+        """
+        request = context['request']
+        cls_path = '%s.%s' % (self.__class__.__module__,
+                              self.__class__.__name__)
+        dashboard = context.get('dashboard')
+        parts = [
+            cls_path,
+            self.id,
+            dashboard.get_id() if dashboard is not None else None,
+        ] + get_versions('dashboard_module:%s' % cls_path)
+        for value in self.cache_vary_on:
+            if value == 'user':
+                parts.append(request.user.pk)
+            elif value == 'permissions':
+                parts.append(get_permissions_version(request.user))
+            elif value == 'language':
+                parts.append(get_language())
+            elif value == 'site':
+                parts.append(get_admin_site_name(context))
+            else:
+                raise ValueError('Invalid cache_vary_on value: "%s"' % value)
+        return make_key('dashboard_module', *parts)
+
+    @classmethod
+    def invalidate_cache(cls):
+        """
+        Invalidates the cached renderings of all the modules of this class,
+        for example::
+
+            @receiver(post_save, sender=Order)
+            def order_saved(**kwargs):
+                MyStatsModule.invalidate_cache()
+        """
+        bump_version('dashboard_module:%s.%s' % (cls.__module__, cls.__name__))
+
     def _prepare_children(self):
         pass
 
@@ -247,7 +349,8 @@ class Group(DashboardModule):
             module.deletable = False
             if self.force_show_title:
                 module.show_title = (self.display == 'stacked')
-            module.init_with_context(context)
+            if not module._initialized:
+                module.init_with_context(context)
         self._initialized = True
 
     def is_empty(self):
@@ -379,6 +482,115 @@ class LinkList(DashboardModule):
         self._initialized = True
 
 
+class Node(MutableMapping):
+    """
+    Base class of the lightweight children generated by the
+    :class:`~admin_tools.dashboard.modules.AppList` and
+    :class:`~admin_tools.dashboard.modules.ModelList` modules, which are
+    built for each request. The properties are stored in slots (the
+    instances have no ``__dict__``), unset ones are ``None``. Nodes are
+    also mutable mappings, like the dicts used by previous versions: the
+    set properties are their keys and other keys can be added::
+
+        >>> from admin_tools.dashboard.modules import ModelNode
+        >>> node = ModelNode(title='Users', change_url='/users/')
+        >>> node.title, node['change_url'], node.get('add_url', '#')
+        ('Users', '/users/', '#')
+        >>> 'add_url' in node
+        False
+        >>> node['icon'] = 'user.png'
+        >>> sorted(node.keys())
+        ['change_url', 'icon', 'title']
+        >>> node == {'title': 'Users', 'change_url': '/users/',
+        ...          'icon': 'user.png'}
+        True
+
+    Unlike dicts, nodes cannot be serialized by ``json.dumps``, serialize
+    ``dict(node)`` instead.
+    """
+    __slots__ = ('_extra',)
+
+    def __init__(self, **kwargs):
+        self._extra = None
+        for name in self.__slots__:
+            setattr(self, name, kwargs.pop(name, None))
+        if kwargs:
+            raise TypeError(
+                'Unexpected properties: %s' % ', '.join(sorted(kwargs))
+            )
+
+    def __getitem__(self, key):
+        if key in self.__slots__:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.__slots__:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.__slots__:
+            setattr(self, key, None)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for name in self.__slots__:
+            if getattr(self, name) is not None:
+                yield name
+        if self._extra is not None:
+            for key in self._extra:
+                yield key
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return '<%s: %r>' % (self.__class__.__name__, dict(self))
+
+
+class AppNode(Node):
+    """
+    An app of the :class:`~admin_tools.dashboard.modules.AppList` module,
+    with its ``title``, ``url`` and the list of its ``models``
+    (:class:`~admin_tools.dashboard.modules.ModelNode` instances).
+    """
+    __slots__ = ('title', 'url', 'models')
+
+
+class ModelNode(Node):
+    """
+    A model of the :class:`~admin_tools.dashboard.modules.AppList` and
+    :class:`~admin_tools.dashboard.modules.ModelList` modules, with its
+    ``title``, its ``change_url`` and its ``add_url`` (``None`` if the
+    user is not allowed to change or add instances of the model).
+    """
+    __slots__ = ('title', 'change_url', 'add_url')
+
+
+def _get_model_node(module, model, perms, context):
+    change_url = add_url = None
+    if perms['change'] or perms.get('view', False):
+        change_url = module._get_admin_change_url(model, context)
+    if perms['add']:
+        add_url = module._get_admin_add_url(model, context)
+    return ModelNode(
+        title=model._meta.verbose_name_plural,
+        change_url=change_url,
+        add_url=add_url
+    )
+
+
 class AppList(DashboardModule, AppListElementMixin):
     """
     Module that lists installed apps and their models.
@@ -450,26 +662,18 @@ class AppList(DashboardModule, AppListElementMixin):
         for model, perms in items:
             app_label = model._meta.app_label
             if app_label not in apps:
-                apps[app_label] = {
-                    'title':
-                        django_apps.get_app_config(app_label).verbose_name,
-                    'url': self._get_admin_app_list_url(model, context),
-                    'models': []
-                }
-            model_dict = {}
-            model_dict['title'] = model._meta.verbose_name_plural
-            if perms['change'] or perms.get('view', False):
-                model_dict['change_url'] = self._get_admin_change_url(
-                    model,
-                    context
+                apps[app_label] = AppNode(
+                    title=django_apps.get_app_config(app_label).verbose_name,
+                    url=self._get_admin_app_list_url(model, context),
+                    models=[]
                 )
-            if perms['add']:
-                model_dict['add_url'] = self._get_admin_add_url(model, context)
-            apps[app_label]['models'].append(model_dict)
+            apps[app_label].models.append(
+                _get_model_node(self, model, perms, context)
+            )
 
         for app in sorted(apps.keys()):
             # sort model list alphabetically
-            apps[app]['models'].sort(key=lambda x: x['title'])
+            apps[app].models.sort(key=lambda x: x.title)
             self.children.append(apps[app])
         self._initialized = True
 
@@ -542,24 +746,17 @@ class ModelList(DashboardModule, AppListElementMixin):
         if not items:
             return
         for model, perms in items:
-            model_dict = {}
-            model_dict['title'] = model._meta.verbose_name_plural
-            if perms['change'] or perms.get('view', False):
-                model_dict['change_url'] = self._get_admin_change_url(
-                    model,
-                    context
-                )
-            if perms['add']:
-                model_dict['add_url'] = self._get_admin_add_url(model, context)
-            self.children.append(model_dict)
+            self.children.append(
+                _get_model_node(self, model, perms, context)
+            )
         if self.extra:
             # TODO - permissions support
             for extra_url in self.extra:
-                model_dict = {}
-                model_dict['title'] = extra_url['title']
-                model_dict['change_url'] = extra_url['change_url']
-                model_dict['add_url'] = extra_url.get('add_url', None)
-                self.children.append(model_dict)
+                self.children.append(ModelNode(
+                    title=extra_url['title'],
+                    change_url=extra_url['change_url'],
+                    add_url=extra_url.get('add_url', None)
+                ))
 
         self._initialized = True
 
@@ -601,9 +798,34 @@ class RecentActions(DashboardModule):
     The screenshot of what this code produces:
 
     .. image:: images/recentactions_dashboard_module.png
+
+    .. note::
+
+        The recent actions are fetched by filtering the ``django_admin_log``
+        table on the user and on content type ids, ordered by action time.
+        On large tables, an index on ``(user_id, action_time)`` turns this
+        query into an index range scan, it can be added with a migration
+        of one of your apps::
+
+            from django.db import migrations
+
+            class Migration(migrations.Migration):
+
+                dependencies = [
+                    ('admin', '0001_initial'),
+                ]
+
+                operations = [
+                    migrations.RunSQL(
+                        'CREATE INDEX django_admin_log_user_time_idx '
+                        'ON django_admin_log (user_id, action_time)',
+                        'DROP INDEX django_admin_log_user_time_idx',
+                    ),
+                ]
     """
     title = _('Recent Actions')
     template = 'admin_tools/dashboard/modules/recent_actions.html'
+    thread_safe = True
     limit = 10
     include_list = None
     exclude_list = None
@@ -618,47 +840,96 @@ class RecentActions(DashboardModule):
     def init_with_context(self, context):
         if self._initialized:
             return
-        from django.db.models import Q
+        children = self._get_cached_children(context)
+        if children is None:
+            children = self._get_queryset(context)
+        self._set_children(children)
+
+    def ainit_with_context(self, context):
+        from admin_tools.async_utils import ainit_recent_actions
+
+        return ainit_recent_actions(self, context)
+
+    def _get_content_type_ids(self, contenttypes):
+        # Import this here to silence RemovedInDjango19Warning. See #15
+        from django.apps import apps
+        from django.contrib.contenttypes.models import ContentType
+
+        ids = []
+        for contenttype in contenttypes:
+            if isinstance(contenttype, ContentType):
+                ids.append(contenttype.id)
+                continue
+            try:
+                app_label, model = contenttype.split('.')
+            except ValueError:
+                raise ValueError('Invalid contenttype: "%s"' % contenttype)
+            # content types are cached by their manager, the admin logs the
+            # actions on proxy models with their own content type
+            try:
+                ids.append(ContentType.objects.get_for_model(
+                    apps.get_model(app_label, model), for_concrete_model=False
+                ).id)
+            except LookupError:
+                # stale content type of an uninstalled model
+                try:
+                    ids.append(ContentType.objects.get_by_natural_key(
+                        app_label, model
+                    ).id)
+                except ContentType.DoesNotExist:
+                    pass
+        return ids
+
+    def _get_cached_children(self, context):
+        """
+        Returns the log entries to display from the recent actions cached
+        for the user (see ``ADMIN_TOOLS_RECENT_ACTIONS_CACHE_SIZE``), or
+        ``None`` if they are not cached or do not hold enough entries.
+        """
+        from admin_tools.dashboard.utils import (
+            _get_recent_actions_size, get_recent_actions
+        )
+
+        cached = get_recent_actions(context['request'].user)
+        if cached is None:
+            return None
+        entries = cached
+        if self.include_list:
+            ids = set(self._get_content_type_ids(self.include_list))
+            entries = [e for e in entries if e.content_type_id in ids]
+        if self.exclude_list:
+            ids = set(self._get_content_type_ids(self.exclude_list))
+            entries = [e for e in entries if e.content_type_id not in ids]
+        if len(entries) < self.limit and \
+                len(cached) >= _get_recent_actions_size():
+            # older matching entries may not be cached
+            return None
+        return entries[:self.limit]
+
+    def _get_queryset(self, context):
         from django.contrib.admin.models import LogEntry
 
         request = context['request']
 
-        def get_qset(list):
-            # Import this here to silence RemovedInDjango19Warning. See #15
-            from django.contrib.contenttypes.models import ContentType
-
-            qset = None
-            for contenttype in list:
-                if isinstance(contenttype, ContentType):
-                    current_qset = Q(content_type__id=contenttype.id)
-                else:
-                    try:
-                        app_label, model = contenttype.split('.')
-                    except:
-                        raise ValueError(
-                            'Invalid contenttype: "%s"' % contenttype
-                        )
-                    current_qset = Q(
-                        content_type__app_label=app_label,
-                        content_type__model=model
-                    )
-                if qset is None:
-                    qset = current_qset
-                else:
-                    qset = qset | current_qset
-            return qset
-
         if request.user is None:
             qs = LogEntry.objects.all()
         else:
-            qs = LogEntry.objects.filter(user__pk__exact=request.user.pk)
+            qs = LogEntry.objects.filter(user_id=request.user.pk)
 
+        # filtering on content type ids avoids joining django_content_type
         if self.include_list:
-            qs = qs.filter(get_qset(self.include_list))
+            qs = qs.filter(content_type_id__in=self._get_content_type_ids(
+                self.include_list
+            ))
         if self.exclude_list:
-            qs = qs.exclude(get_qset(self.exclude_list))
+            qs = qs.exclude(content_type_id__in=self._get_content_type_ids(
+                self.exclude_list
+            ))
+
+        return qs.select_related('content_type', 'user')[:self.limit]
 
-        self.children = qs.select_related('content_type', 'user')[:self.limit]
+    def _set_children(self, children):
+        self.children = children
         if not len(self.children):
             self.pre_content = _('No recent actions.')
         self._initialized = True
@@ -676,8 +947,8 @@ class Feed(DashboardModule):
         FeedParser are thus supported by the Feed
 
     As well as the :class:`~admin_tools.dashboard.modules.DashboardModule`
-    properties, the :class:`~admin_tools.dashboard.modules.Feed` takes two
-    extra keyword arguments:
+    properties, the :class:`~admin_tools.dashboard.modules.Feed` takes the
+    following extra keyword arguments:
 
     ``feed_url``
         The URL of the feed.
@@ -686,6 +957,15 @@ class Feed(DashboardModule):
         The maximum number of feed children to display. Default value: None,
         which means that all children are displayed.
 
+    ``refresh_interval``
+        The feed is fetched once and then served from the admin tools cache,
+        it is refreshed in background (with a conditional GET) when it is
+        older than this number of seconds. Default value: 3600.
+
+    ``timeout``
+        The timeout in seconds of the requests to the feed URL.
+        Default value: 5.
+
     Here's a small example of building a recent actions module::
 
         from admin_tools.dashboard import modules, Dashboard
@@ -708,8 +988,11 @@ class Feed(DashboardModule):
 
     title = _('RSS Feed')
     template = 'admin_tools/dashboard/modules/feed.html'
+    thread_safe = True
     feed_url = None
     limit = None
+    refresh_interval = 3600
+    timeout = 5
 
     def __init__(self, title=None, feed_url=None, limit=None, **kwargs):
         kwargs.update({'feed_url': feed_url, 'limit': limit})
@@ -718,7 +1001,6 @@ class Feed(DashboardModule):
     def init_with_context(self, context):
         if self._initialized:
             return
-        import datetime
         if self.feed_url is None:
             raise ValueError('You must provide a valid feed URL')
         try:
@@ -730,17 +1012,19 @@ class Feed(DashboardModule):
             })
             return
 
-        feed = feedparser.parse(self.feed_url)
+        from admin_tools.dashboard.feeds import get_feed_entries
+
+        try:
+            entries = get_feed_entries(
+                self.feed_url, self.refresh_interval, self.timeout
+            )
+        except Exception:
+            self.children.append({
+                'title': _('The feed is currently unavailable'),
+                'warning': True,
+            })
+            return
         if self.limit is not None:
-            entries = feed['entries'][:self.limit]
-        else:
-            entries = feed['entries']
-        for entry in entries:
-            entry.url = entry.link
-            try:
-                entry.date = datetime.date(*entry.published_parsed[0:3])
-            except:
-                # no date for certain feeds
-                pass
-            self.children.append(entry)
+            entries = entries[:self.limit]
+        self.children.extend(entries)
         self._initialized = True
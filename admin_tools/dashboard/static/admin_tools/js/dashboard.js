@@ -1,13 +1,112 @@
 var init_dashboard = function(id, columns, preferences, url) {
+    var save_preferences = preferences_saver(url, preferences, function() {
+        return jQuery('#'+id).find('div[id^="module_"]').map(function() {
+            return this.id;
+        }).get();
+    });
     jQuery('#'+id).dashboard({
         'columns': columns,
         'load_preferences_function': function(options) {
             return preferences;
         },
         'save_preferences_function': function(options, preferences) {
-            jQuery.post(url, { data: JSON.stringify(preferences) });
+            save_preferences(preferences);
         }
     });
-    jQuery(".group-tabs").tabs();
-    jQuery(".group-accordion").accordion({header: '.group-accordion-header'});
+    init_groups(jQuery(document));
+    load_lazy_modules();
+};
+
+// jQuery UI is not loaded when no group is displayed in tabs or accordion
+var init_groups = function(elt) {
+    if (jQuery.fn.tabs) {
+        elt.find(".group-tabs").tabs();
+        elt.find(".group-accordion").accordion({header: '.group-accordion-header'});
+    }
+};
+
+var load_lazy_modules = function() {
+    jQuery('.dashboard-module[data-lazy-url]').each(function() {
+        var module = jQuery(this);
+        jQuery.get(module.attr('data-lazy-url'), function(html) {
+            var content = jQuery('<div/>').html(html).find(
+                '.dashboard-module-content'
+            ).first();
+            if (!content.length) {
+                // empty module
+                module.remove();
+                return;
+            }
+            module.removeAttr('data-lazy-url');
+            module.find('.dashboard-module-content').replaceWith(content);
+            init_groups(content);
+        });
+    });
+};
+
+// Returns a function that saves the dashboard preferences: changes are
+// sent to the server as a single patch once the user stops changing the
+// dashboard for a second (or leaves the page). The ids of the displayed
+// modules are sent along so that the state of removed modules is dropped.
+var preferences_saver = function(url, saved, get_modules) {
+    var copy = function(obj) { return JSON.parse(JSON.stringify(obj)); };
+    var current = null;
+    var timer = null;
+    saved = copy(saved);
+
+    var get_patch = function() {
+        var patch = {};
+        var changed = false;
+        jQuery.each(current, function(cat, value) {
+            if (jQuery.isPlainObject(value) && jQuery.isEmptyObject(value)) {
+                // placeholder of a category that was never set
+                return;
+            }
+            if (jQuery.isPlainObject(value) && jQuery.isPlainObject(saved[cat])) {
+                // collapsed and disabled modules: only send changed modules
+                jQuery.each(value, function(id, val) {
+                    if (saved[cat][id] !== val) {
+                        patch[cat] = patch[cat] || {};
+                        patch[cat][id] = val;
+                        changed = true;
+                    }
+                });
+            } else if (JSON.stringify(value) != JSON.stringify(saved[cat])) {
+                patch[cat] = value;
+                changed = true;
+            }
+        });
+        return changed ? patch : null;
+    };
+
+    var flush = function(unloading) {
+        clearTimeout(timer);
+        timer = null;
+        var patch = current && get_patch();
+        if (!patch) {
+            return;
+        }
+        var sent = copy(current);
+        patch = JSON.stringify(patch);
+        var modules = JSON.stringify(get_modules());
+        if (unloading && window.FormData && navigator.sendBeacon) {
+            var data = new FormData();
+            data.append('patch', patch);
+            data.append('modules', modules);
+            navigator.sendBeacon(url, data);
+        } else {
+            // a rejected patch is sent again with the next changes
+            jQuery.post(url, { patch: patch, modules: modules }, function() {
+                saved = sent;
+            });
+        }
+    };
+
+    jQuery(window).bind('beforeunload', function() { flush(true); });
+
+    return function(preferences) {
+        current = copy(preferences);
+        clearTimeout(timer);
+        timer = setTimeout(flush, 1000);
+    };
 };
@@ -70,7 +70,7 @@
             if (options.load_preferences_function) {
                 preferences = options.load_preferences_function(options);
             } else {
-                var json_str = $.cookie('admin-tools.' + options.dashboard_id);
+                var json_str = $.cookie ? $.cookie('admin-tools.' + options.dashboard_id) : null;
                 preferences = json_str ? JSON.parse(json_str) : {};
             }
         }
@@ -178,6 +178,10 @@
     };
 
     var _set_draggable = function(elt, options) {
+        // jQuery UI is not loaded when no module is draggable
+        if (!$.fn.sortable) {
+            return;
+        }
         // the dashboard column
         elt.children('.dashboard-column').sortable({
             handle: 'h2',
@@ -281,7 +285,7 @@
             return options.load_preferences_function(options);
         }
         if (preferences === false) {
-            var json_str = $.cookie('admin-tools.' + options.dashboard_id);
+            var json_str = $.cookie ? $.cookie('admin-tools.' + options.dashboard_id) : null;
             preferences = json_str ? JSON.parse(json_str) : {};
         }
         return preferences;
@@ -321,7 +325,7 @@
         if (save && JSON.stringify(preferences) != last_saved_preferences) {
             if (options.save_preferences_function) {
                 options.save_preferences_function(options, preferences);
-            } else {
+            } else if ($.cookie) {
                 $.cookie(cookie_name, JSON.stringify(preferences), {expires: 1825});
             }
             last_saved_preferences = JSON.stringify(preferences);
@@ -336,6 +340,13 @@
             });
         } else {
             elt.children('.dashboard-column').each(function() {
+                if (!$.fn.sortable) {
+                    // same as sortable('toArray')
+                    $(this).children('.draggable').each(function() {
+                        modules.push($(this).attr('id'));
+                    });
+                    return;
+                }
                 $.each($(this).sortable('toArray'), function(index, item) {
                     modules.push(item);
                 });
@@ -10,15 +10,33 @@ To load the dashboard tags: ``{% load admin_tools_dashboard_tags %}``.
 import math
 
 from django import template
-from django.db import IntegrityError
 try:
     from django.urls import reverse
 except ImportError:
     from django.core.urlresolvers import reverse
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
 
-from admin_tools.utils import get_admin_site_name
-from admin_tools.dashboard.utils import get_dashboard
-from admin_tools.dashboard.models import DashboardPreferences
+from admin_tools.bundles import (
+    JQUERY_UI, get_bundle_scripts, use_modern_assets
+)
+from admin_tools.cache import get_cache
+from admin_tools.dashboard.fields import dumps
+from admin_tools.dashboard.modules import Group
+from admin_tools.utils import (
+    get_admin_site_name, get_admin_url, get_user_state
+)
+from admin_tools.dashboard.utils import (
+    get_dashboard, init_modules_async, init_modules_concurrently,
+    needs_jquery_ui, prune_preferences
+)
+
+# characters escaped so that JSON can be embedded in a <script> element
+_JSON_SCRIPT_ESCAPES = (
+    ('<', '\\u003c'),
+    ('>', '\\u003e'),
+    ('&', '\\u0026'),
+)
 
 register = template.Library()
 tag_func = register.inclusion_tag(
@@ -27,6 +45,21 @@ tag_func = register.inclusion_tag(
 )
 
 
+def _get_module_ids(modules):
+    for module in modules:
+        yield module.id
+        if isinstance(module, Group):
+            for module_id in _get_module_ids(module.children):
+                yield module_id
+
+
+def _dumps_for_script(value):
+    json = dumps(value)
+    for char, escape in _JSON_SCRIPT_ESCAPES:
+        json = json.replace(char, escape)
+    return mark_safe(json)
+
+
 def admin_tools_render_dashboard(context, location='index', dashboard=None):
     """
     Template tag that renders the dashboard, it takes two optional arguments:
@@ -46,50 +79,109 @@ def admin_tools_render_dashboard(context, location='index', dashboard=None):
 
     dashboard.init_with_context(context)
     dashboard._prepare_children()
-
-    try:
-        preferences = DashboardPreferences.objects.get(
-            user=context['request'].user,
-            dashboard_id=dashboard.get_id()
-        ).data
-    except DashboardPreferences.DoesNotExist:
-        preferences = '{}'
-        try:
-            DashboardPreferences(
-                user=context['request'].user,
-                dashboard_id=dashboard.get_id(),
-                data=preferences
-            ).save()
-        except IntegrityError:
-            # dashboard already was saved for that (user, dashboard)
-            pass
+    stream = context.get('dashboard_stream')
+    if stream is None and not init_modules_async(dashboard.children, context):
+        init_modules_concurrently(dashboard.children, context)
+
+    request = context['request']
+    preferences = get_user_state(request)['preferences'].get(
+        dashboard.get_id(), {}
+    )
+    # the modules that are not displayed are left out of the preferences
+    # sent to the javascript, but their stored state is kept: they may only
+    # be missing for this request (e.g. because of permissions)
+    pruned = prune_preferences(
+        preferences, list(_get_module_ids(dashboard.children))
+    )
+
+    modern_assets = use_modern_assets()
+    load_jquery_ui = not modern_assets or needs_jquery_ui(dashboard.children)
+    media_js = list(dashboard.Media.js)
+    if modern_assets and load_jquery_ui:
+        media_js.insert(0, JQUERY_UI)
 
     context.update({
         'template': dashboard.template,
         'dashboard': dashboard,
-        'dashboard_preferences': preferences,
+        'dashboard_location': location,
+        'dashboard_preferences': _dumps_for_script(pruned),
         'split_at': math.ceil(
             float(len(dashboard.children)) / float(dashboard.columns)
         ),
         'has_disabled_modules': len(
             [m for m in dashboard.children if not m.enabled]
         ) > 0,
-        'admin_url': reverse('%s:index' % get_admin_site_name(context)),
+        'modern_assets': modern_assets,
+        'load_jquery_ui': load_jquery_ui,
+        'bundle_scripts': get_bundle_scripts(request, media_js),
+        'admin_url': get_admin_url(get_admin_site_name(context), 'index'),
     })
+    if stream is not None:
+        # modules are rendered by the streaming index view
+        stream.context = context.flatten()
     return context
 admin_tools_render_dashboard = tag_func(admin_tools_render_dashboard)
 
 
+def _get_lazy_url(context, module):
+    params = {
+        'location': context.get('dashboard_location', 'index'),
+        'path': context['request'].path,
+    }
+    if params['location'] == 'app_index':
+        params['app_label'] = context['app_list'][0]['app_label']
+    return '%s?%s' % (
+        reverse(
+            'admin-tools-dashboard-module',
+            args=(context['dashboard'].get_id(), module.id)
+        ),
+        urlencode(params)
+    )
+
+
 def admin_tools_render_dashboard_module(context, module):
     """
     Template tag that renders a given dashboard module, it takes a
     ``DashboardModule`` instance as first parameter.
     """
-    module.init_with_context(context)
     context.update({
         'template': module.template,
         'module': module,
-        'admin_url': reverse('%s:index' % get_admin_site_name(context)),
+        'admin_url': get_admin_url(get_admin_site_name(context), 'index'),
+    })
+    if module.lazy and not context.get('lazy_modules_loaded'):
+        # the module will be loaded by the dashboard javascript
+        context.update({
+            'template': 'admin_tools/dashboard/lazy_module.html',
+            'lazy_url': _get_lazy_url(context, module),
+        })
+        return context
+    stream = context.get('dashboard_stream')
+    if stream is not None:
+        # the module will be sent after the page by the streaming index view
+        stream.modules.append(module)
+        context.update({
+            'template': 'admin_tools/dashboard/lazy_module.html',
+            'lazy_url': None,
+        })
+        return context
+    if not module.cache_timeout:
+        if not module._initialized:
+            module.init_with_context(context)
+        return context
+
+    cache = get_cache()
+    key = module.get_cache_key(context)
+    html = cache.get(key)
+    if html is None:
+        module.init_with_context(context)
+        html = context.template.engine.get_template(module.template).render(
+            context.new(context.flatten())
+        )
+        cache.set(key, html, module.cache_timeout)
+    context.update({
+        'template': 'admin_tools/dashboard/cached_module.html',
+        'module_html': mark_safe(html),
     })
     return context
 admin_tools_render_dashboard_module = tag_func(
@@ -119,6 +211,7 @@ def admin_tools_render_dashboard_css(
     context.update({
         'template': 'admin_tools/dashboard/css.html',
         'css_files': dashboard.Media.css,
+        'modern_assets': use_modern_assets(),
     })
     return context
 admin_tools_render_dashboard_css = tag_func(admin_tools_render_dashboard_css)
@@ -1,11 +1,44 @@
+import json
+import threading
+import time
 from tempfile import mktemp
-from unittest import TestCase
-from django.test import TestCase as DjangoTestCase
+from unittest import TestCase, skipUnless
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+try:
+    import feedparser
+except ImportError:
+    feedparser = None
+from django.test import (
+    SimpleTestCase, TestCase as DjangoTestCase, TransactionTestCase
+)
 from django.core import management
+from django.core.cache import cache
 from django.contrib.auth import models as auth_models
+from django.template import Context, RequestContext, Template
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from django.core.exceptions import ValidationError
 
-from admin_tools.dashboard import AppIndexDashboard
-from admin_tools.dashboard.modules import DashboardModule, Group
+from admin_tools.dashboard import AppIndexDashboard, feeds
+from admin_tools.dashboard.modules import (
+    AppList, AppNode, DashboardModule, Feed, Group, ModelList, ModelNode,
+    Node, RecentActions
+)
+from admin_tools.dashboard.models import DashboardPreferences
+from admin_tools.dashboard.utils import (
+    init_modules_async, init_modules_concurrently, prune_preferences
+)
 
 
 class ManagementCommandTest(DjangoTestCase):
@@ -34,8 +67,599 @@ class AppIndexDashboardTest(TestCase):
         )
 
 
+class CountingModule(DashboardModule):
+    cache_timeout = 60
+    calls = 0
+
+    def init_with_context(self, context):
+        CountingModule.calls += 1
+        self.pre_content = 'rendered %d' % CountingModule.calls
+
+
+class ModuleCacheTest(DjangoTestCase):
+    def setUp(self):
+        cache.clear()
+        CountingModule.calls = 0
+        self.user = auth_models.User.objects.create_superuser(
+            'admin', 'admin@example.com', 'admin'
+        )
+
+    def _render(self, module, user=None):
+        request = RequestFactory().get('/admin/')
+        request.user = user or self.user
+        template = Template(
+            '{% load admin_tools_dashboard_tags %}'
+            '{% admin_tools_render_dashboard_module module %}'
+        )
+        return template.render(RequestContext(request, {'module': module}))
+
+    def test_cached_render(self):
+        first = self._render(CountingModule(id='1'))
+        self.assertIn('rendered 1', first)
+        self.assertEqual(self._render(CountingModule(id='1')), first)
+        self.assertEqual(CountingModule.calls, 1)
+
+    def test_vary_on_user_and_id(self):
+        self._render(CountingModule(id='1'))
+        self._render(CountingModule(id='2'))
+        other = auth_models.User.objects.create_superuser(
+            'other', 'other@example.com', 'other'
+        )
+        self._render(CountingModule(id='1'), user=other)
+        self.assertEqual(CountingModule.calls, 3)
+
+    def test_invalidate_cache(self):
+        self._render(CountingModule(id='1'))
+        CountingModule.invalidate_cache()
+        self.assertIn('rendered 2', self._render(CountingModule(id='1')))
+
+    def test_no_cache_timeout(self):
+        self._render(DashboardModule(id='1'))
+        module = CountingModule(id='1', cache_timeout=None)
+        self._render(module)
+        self._render(module)
+        self.assertEqual(CountingModule.calls, 2)
+
+
+class RecentActionsMixin(object):
+
+    def setUp(self):
+        from django.contrib.admin.models import LogEntry, ADDITION
+        from django.contrib.contenttypes.models import ContentType
+
+        self.user = auth_models.User.objects.create(username='user')
+        for model in (auth_models.User, auth_models.Group):
+            LogEntry.objects.log_action(
+                self.user.pk, ContentType.objects.get_for_model(model).pk,
+                '1', 'object', ADDITION
+            )
+        self.context = Context({'request': RequestFactory().get('/')})
+        self.context['request'].user = self.user
+        ContentType.objects.clear_cache()
+
+    def _get_models(self, **kwargs):
+        module = RecentActions(**kwargs)
+        module.init_with_context(self.context)
+        return [entry.content_type.model for entry in module.children]
+
+
+class RecentActionsTest(RecentActionsMixin, DjangoTestCase):
+
+    def test_filters(self):
+        self.assertEqual(self._get_models(), ['group', 'user'])
+        self.assertEqual(
+            self._get_models(include_list=['auth.user']), ['user']
+        )
+        self.assertEqual(
+            self._get_models(exclude_list=['auth.user']), ['group']
+        )
+        self.assertEqual(self._get_models(include_list=['foo.bar']), [])
+        self.assertRaises(ValueError, self._get_models, include_list=['foo'])
+
+    def test_proxy_models(self):
+        from django.contrib.admin.models import LogEntry, ADDITION
+        from django.contrib.contenttypes.models import ContentType
+        from test_app.models import ProxyFoo
+
+        LogEntry.objects.log_action(
+            self.user.pk,
+            ContentType.objects.get_for_model(
+                ProxyFoo, for_concrete_model=False
+            ).pk,
+            '1', 'object', ADDITION
+        )
+        self.assertEqual(
+            self._get_models(include_list=['test_app.proxyfoo']),
+            ['proxyfoo']
+        )
+        self.assertEqual(self._get_models(include_list=['test_app.foo']), [])
+        self.assertEqual(
+            self._get_models(exclude_list=['test_app.proxyfoo']),
+            ['group', 'user']
+        )
+
+    @skipUnless(asyncio, 'asyncio is not available')
+    @override_settings(ADMIN_TOOLS_ASYNC_INIT=True)
+    def test_async_init(self):
+        from django.contrib.contenttypes.models import ContentType
+
+        # the content type ids are fetched from the database
+        ContentType.objects.clear_cache()
+        module = RecentActions(include_list=['auth.user'])
+        self.assertTrue(init_modules_async([module], self.context))
+        self.assertEqual(module.css_classes, [])
+        self.assertEqual(
+            [entry.content_type.model for entry in module.children], ['user']
+        )
+
+    def test_no_content_type_join(self):
+        module = RecentActions(include_list=['auth.user', 'auth.group'])
+        # content types are resolved once, then served by their cache
+        module._get_queryset(self.context)
+        qs = module._get_queryset(self.context)
+        where = str(qs.query).split('WHERE')[1]
+        self.assertNotIn('django_content_type', where)
+        self.assertIn('"user_id" =', where)
+        with self.assertNumQueries(1):
+            list(qs)
+
+
+# the cached entries are updated when the transaction is committed
+@override_settings(ADMIN_TOOLS_RECENT_ACTIONS_CACHE_SIZE=2)
+class RecentActionsCacheTest(RecentActionsMixin, TransactionTestCase):
+
+    def test_cached_entries(self):
+        from django.contrib.admin.models import LogEntry, CHANGE
+        from django.contrib.contenttypes.models import ContentType
+        from django.db import transaction
+
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get_models(limit=2), ['group', 'user'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get_models(limit=2), ['group', 'user'])
+        content_type = ContentType.objects.get_for_model(self.user)
+        LogEntry.objects.log_action(
+            self.user.pk, content_type.pk, '1', 'object', CHANGE
+        )
+        # the committed entry is added to the cached list
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get_models(limit=2), ['user', 'group'])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self._get_models(limit=1, include_list=['auth.user']),
+                ['user']
+            )
+        # the first entry for users is not cached
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                self._get_models(include_list=['auth.user']), ['user', 'user']
+            )
+
+        # entries of a rolled back transaction are not cached
+        try:
+            with transaction.atomic():
+                LogEntry.objects.log_action(
+                    self.user.pk, content_type.pk, '1', 'object', CHANGE
+                )
+                raise ValueError
+        except ValueError:
+            pass
+        with self.assertNumQueries(0):
+            self.assertEqual(self._get_models(limit=2), ['user', 'group'])
+
+        LogEntry.objects.all().delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(self._get_models(), [])
+
+
+class AppListTest(DjangoTestCase):
+
+    def setUp(self):
+        request = RequestFactory().get('/admin/')
+        request.user = auth_models.User.objects.create(
+            username='superuser', is_staff=True, is_superuser=True
+        )
+        self.context = Context({'request': request})
+
+    def test_nodes(self):
+        module = AppList(models=['django.contrib.auth.*'])
+        module.init_with_context(self.context)
+        app = module.children[0]
+        self.assertIsInstance(app, AppNode)
+        self.assertEqual(app.title, 'Authentication and Authorization')
+        self.assertEqual(app['url'], '/admin/auth/')
+        self.assertEqual(
+            [(m.title, m.change_url, m['add_url']) for m in app.models],
+            [('groups', '/admin/auth/group/', '/admin/auth/group/add/'),
+             ('users', '/admin/auth/user/', '/admin/auth/user/add/')]
+        )
+        self.assertFalse(hasattr(app, '__dict__'))
+
+        module = ModelList(
+            models=['django.contrib.auth.models.User'],
+            extra=[{'title': 'Extra', 'change_url': '/extra/'}]
+        )
+        module.init_with_context(self.context)
+        self.assertEqual(
+            [(m.title, m.change_url, m.add_url) for m in module.children],
+            [('users', '/admin/auth/user/', '/admin/auth/user/add/'),
+             ('Extra', '/extra/', None)]
+        )
+
+    def test_mapping_api(self):
+        node = ModelNode(title='Users', change_url='/users/')
+        self.assertNotIn('add_url', node)
+        self.assertEqual(node.get('add_url', '#'), '#')
+        node['add_url'] = '/users/add/'
+        self.assertEqual(node.add_url, '/users/add/')
+        self.assertIn('add_url', node)
+        self.assertRaises(KeyError, node.__getitem__, 'url')
+        self.assertRaises(TypeError, ModelNode, url='/users/')
+        self.assertEqual(
+            Template('{{ node.title }} {{ node.add_url }}').render(
+                Context({'node': node})
+            ),
+            'Users /users/add/'
+        )
+
+        # the dict API of previous versions
+        node.update({'title': 'People', 'icon': 'user.png'})
+        self.assertEqual(dict(node.items()), {
+            'title': 'People',
+            'change_url': '/users/',
+            'add_url': '/users/add/',
+            'icon': 'user.png',
+        })
+        self.assertEqual(len(node), 4)
+        del node['add_url']
+        self.assertIsNone(node.add_url)
+        self.assertEqual(node.pop('icon'), 'user.png')
+        self.assertEqual(sorted(node.keys()), ['change_url', 'title'])
+        self.assertEqual(
+            json.loads(json.dumps(dict(node))),
+            {'title': 'People', 'change_url': '/users/'}
+        )
+
+    def _measure(self, factory):
+        values = [
+            ('model %d' % i, '/model/%d/' % i, '/model/%d/add/' % i)
+            for i in range(1000)
+        ]
+        tracemalloc.start()
+        try:
+            nodes = [factory(*value) for value in values]
+            return tracemalloc.get_traced_memory()[0], nodes
+        finally:
+            tracemalloc.stop()
+
+    @skipUnless(tracemalloc, 'tracemalloc is not available')
+    def test_memory(self):
+        dicts_size, dicts = self._measure(lambda title, url, add_url: {
+            'title': title, 'change_url': url, 'add_url': add_url,
+        })
+        nodes_size, nodes = self._measure(
+            lambda title, url, add_url: ModelNode(
+                title=title, change_url=url, add_url=add_url,
+            )
+        )
+        self.assertLess(nodes_size, dicts_size * 0.8)
+
+
+class SlowModule(DashboardModule):
+    thread_safe = True
+    delay = 0.2
+
+    def init_with_context(self, context):
+        time.sleep(self.delay)
+        if self.delay < 0:
+            raise ValueError()
+        self.children.append(context['value'])
+
+
+@override_settings(ADMIN_TOOLS_DASHBOARD_INIT_WORKERS=4)
+class ConcurrentInitTest(SimpleTestCase):
+    def _init(self, modules):
+        start = time.time()
+        init_modules_concurrently(modules, Context({'value': 'foo'}))
+        return time.time() - start
+
+    def test_concurrent_init(self):
+        modules = [SlowModule(), SlowModule(), Group(children=[SlowModule()])]
+        self.assertLess(self._init(modules), 0.5)
+        for module in modules[:2] + modules[2].children:
+            self.assertTrue(module._initialized)
+            self.assertEqual(module.children, ['foo'])
+        self.assertFalse(modules[2]._initialized)
+
+    def test_unavailable(self):
+        modules = [
+            SlowModule(init_timeout=0.05),
+            SlowModule(delay=-1),
+            SlowModule(),
+        ]
+        self._init(modules)
+        for module in modules[:2]:
+            self.assertEqual(module.children, [])
+            self.assertIn('unavailable', module.css_classes)
+        self.assertEqual(modules[2].children, ['foo'])
+
+    def test_skipped_modules(self):
+        modules = [
+            DashboardModule(),
+            SlowModule(thread_safe=False),
+            SlowModule(lazy=True),
+            SlowModule(cache_timeout=60),
+        ]
+        self._init(modules)
+        for module in modules:
+            self.assertFalse(module._initialized)
+
+    @override_settings(ADMIN_TOOLS_DASHBOARD_INIT_WORKERS=None)
+    def test_disabled(self):
+        module = SlowModule()
+        self._init([module])
+        self.assertFalse(module._initialized)
+
+
+class AsyncModule(DashboardModule):
+    delay = 0.2
+
+    def ainit_with_context(self, context):
+        self.children.append(context['value'])
+        return asyncio.sleep(self.delay)
+
+
+@skipUnless(asyncio, 'asyncio is not available')
+@override_settings(ADMIN_TOOLS_ASYNC_INIT=True)
+class AsyncInitTest(SimpleTestCase):
+    def _init(self, modules):
+        start = time.time()
+        self.assertTrue(
+            init_modules_async(modules, Context({'value': 'foo'}))
+        )
+        return time.time() - start
+
+    def test_async_init(self):
+        modules = [
+            AsyncModule(), AsyncModule(), Group(children=[AsyncModule()])
+        ]
+        self.assertLess(self._init(modules), 0.5)
+        for module in modules[:2] + modules[2].children:
+            self.assertTrue(module._initialized)
+            self.assertEqual(module.children, ['foo'])
+
+    def test_sync_modules(self):
+        modules = [SlowModule(), SlowModule(thread_safe=False)]
+        self._init(modules)
+        for module in modules:
+            self.assertEqual(module.children, ['foo'])
+
+    def test_unavailable(self):
+        modules = [AsyncModule(init_timeout=0.05), AsyncModule()]
+        self._init(modules)
+        self.assertEqual(modules[0].children, [])
+        self.assertIn('unavailable', modules[0].css_classes)
+        self.assertEqual(modules[1].children, ['foo'])
+
+    @override_settings(ADMIN_TOOLS_ASYNC_INIT=False)
+    def test_disabled(self):
+        self.assertFalse(init_modules_async([AsyncModule()], Context()))
+
+
+FEED = b"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel><title>Test</title>
+<item><title>First</title><link>http://example.com/1</link>
+<pubDate>Mon, 06 Sep 2021 10:00:00 GMT</pubDate></item>
+<item><title>Second</title><link>http://example.com/2</link></item>
+</channel></rss>"""
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        self.wfile.write(FEED)
+
+    def log_message(self, *args):
+        pass
+
+
+@skipUnless(feedparser, 'feedparser is not installed')
+class FeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.server = HTTPServer(('127.0.0.1', 0), FeedHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d/feed/' % self.server.server_port
+
+    def tearDown(self):
+        self._stop_server()
+
+    def _stop_server(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _get_children(self, **kwargs):
+        module = Feed(feed_url=self.url, **kwargs)
+        module.init_with_context({})
+        return module.children
+
+    def test_entries(self):
+        children = self._get_children(limit=1)
+        self.assertEqual(len(children), 1)
+        self.assertEqual(children[0]['title'], 'First')
+        self.assertEqual(children[0]['url'], 'http://example.com/1')
+        self.assertEqual(children[0]['date'].year, 2021)
+        # served from the cache
+        self.assertEqual(len(self._get_children()), 2)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_conditional_refresh(self):
+        self._get_children()
+        record = feeds.refresh_feed(self.url)
+        self.assertEqual(len(record['entries']), 2)
+        self.assertEqual(self.server.requests[1].get('If-None-Match'), '"v1"')
+
+    def test_background_refresh(self):
+        self._get_children()
+        record = cache.get(feeds._get_key(self.url))
+        record['checked'] = time.time() - 60
+        cache.set(feeds._get_key(self.url), record)
+        thread = feeds.refresh_feed_in_background(self.url)
+        thread.join()
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertGreater(
+            cache.get(feeds._get_key(self.url))['checked'], record['checked']
+        )
+
+    def test_single_background_refresh(self):
+        cache.add(feeds.make_key('feed_lock', self.url), True)
+        self.assertIsNone(feeds.refresh_feed_in_background(self.url))
+
+    def test_stale_fallback(self):
+        self._get_children()
+        self._stop_server()
+        record = feeds.refresh_feed(self.url, timeout=1)
+        self.assertEqual(len(record['entries']), 2)
+
+    def test_unavailable(self):
+        self._stop_server()
+        children = self._get_children(timeout=1)
+        self.assertTrue(children[0]['warning'])
+
+    def test_unavailable_retry(self):
+        self._stop_server()
+        self.assertTrue(self._get_children(timeout=1)[0]['warning'])
+        calls = []
+
+        def fetch(*args, **kwargs):
+            calls.append(args)
+            raise AssertionError('fetched while rendering')
+
+        def refresh(*args):
+            calls.append(args)
+
+        for name, func in [('_fetch', fetch),
+                           ('refresh_feed_in_background', refresh)]:
+            self.addCleanup(setattr, feeds, name, getattr(feeds, name))
+            setattr(feeds, name, func)
+
+        # the failure is cached, the next renders do not wait for the feed
+        self.assertTrue(self._get_children(timeout=1)[0]['warning'])
+        self.assertEqual(calls, [])
+
+        # retried in background after the retry interval
+        key = feeds._get_key(self.url)
+        record = cache.get(key)
+        self.assertIsNone(record['entries'])
+        record['checked'] -= feeds.RETRY_INTERVAL + 1
+        cache.set(key, record)
+        self.assertTrue(self._get_children(timeout=1)[0]['warning'])
+        self.assertEqual(calls, [(self.url, 1)])
+
+    def test_recovered(self):
+        cache.set(feeds._get_key(self.url), {
+            'entries': None, 'etag': None, 'modified': None, 'checked': 0
+        })
+        record = feeds.refresh_feed(self.url)
+        self.assertEqual(len(record['entries']), 2)
+        self.assertEqual(len(self._get_children()), 2)
+
+
+class PreferencesFieldTest(DjangoTestCase):
+
+    def setUp(self):
+        self.user = auth_models.User.objects.create(username='user')
+        self.field = DashboardPreferences._meta.get_field('data')
+
+    def test_clean(self):
+        data = {'positions': ['module_1'], 'collapsed': {'module_1': True}}
+        self.assertEqual(self.field.clean(data, None), data)
+        self.assertEqual(
+            self.field.clean('{"columns": [1, 2]}', None), {'columns': [1, 2]}
+        )
+        for value in ('{', '[]', {'foo': 'bar'}, {'columns': ['a']},
+                      {'positions': ['module_1'] * 2000}):
+            self.assertRaises(ValidationError, self.field.clean, value, None)
+
+    def test_script_escapes(self):
+        from admin_tools.dashboard.templatetags.admin_tools_dashboard_tags \
+            import _dumps_for_script
+
+        self.assertEqual(
+            _dumps_for_script({'positions': ['</script>&']}),
+            '{"positions":["\\u003c/script\\u003e\\u0026"]}'
+        )
+
+    def test_compact_storage(self):
+        from django.db import connection
+
+        DashboardPreferences.objects.create(
+            user=self.user, dashboard_id='dashboard',
+            data={'positions': ['module_1', 'module_2']}
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT data FROM admin_tools_dashboard_preferences'
+            )
+            self.assertEqual(
+                cursor.fetchone()[0], '{"positions":["module_1","module_2"]}'
+            )
+
+    def test_corrupt_data(self):
+        preferences = DashboardPreferences.objects.create(
+            user=self.user, dashboard_id='dashboard', data={}
+        )
+        DashboardPreferences.objects.filter(pk=preferences.pk).update(
+            data='{"positions": ['
+        )
+        preferences.refresh_from_db()
+        self.assertEqual(preferences.data, {})
+
+    def test_compact_migration(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module(
+            'admin_tools.dashboard.migrations.0002_json_preferences'
+        )
+        preferences = DashboardPreferences.objects.create(
+            user=self.user, dashboard_id='dashboard', data={}
+        )
+        DashboardPreferences.objects.filter(pk=preferences.pk).update(
+            data='{"positions": ["module_1"], "foo": "bar"}'
+        )
+        migration.compact_preferences(apps, None)
+        preferences.refresh_from_db()
+        self.assertEqual(preferences.data, {'positions': ['module_1']})
+
+    def test_prune(self):
+        preferences = {
+            'positions': ['module_1', 'module_2'],
+            'columns': [1, 1],
+            'collapsed': {'module_2': True, 'module_2_1': False},
+        }
+        self.assertEqual(prune_preferences(preferences, ['1', '2_1']), {
+            'positions': ['module_1'],
+            'columns': [1, 1],
+            'collapsed': {'module_2_1': False},
+        })
+
+
 __test__ = {
     "DashboardModule.is_empty": DashboardModule.is_empty,
     "DashboardModule.render_css_classes": DashboardModule.render_css_classes,
     "Group.is_empty": Group.is_empty,
+    "Node": Node,
 }
@@ -13,4 +13,14 @@ urlpatterns = [
         views.set_preferences,
         name='admin-tools-dashboard-set-preferences'
     ),
+    url(
+        r'^patch_preferences/(?P<dashboard_id>.+)/$',
+        views.patch_preferences,
+        name='admin-tools-dashboard-patch-preferences'
+    ),
+    url(
+        r'^module/(?P<dashboard_id>[^/]+)/(?P<module_id>[^/]+)/$',
+        views.render_module,
+        name='admin-tools-dashboard-module'
+    ),
 ]
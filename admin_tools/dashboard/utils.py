@@ -1,20 +1,47 @@
 """
 Dashboard utilities.
 """
-from django.conf import settings
+import copy
+import threading
+import time
 try:
-    from importlib import import_module
+    from concurrent.futures import ThreadPoolExecutor
 except ImportError:
-    # Django < 1.9 and Python < 2.7
-    from django.utils.importlib import import_module
-from django.utils.text import capfirst
+    ThreadPoolExecutor = None
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_save
 try:
-    from django.urls import reverse
+    from django.urls import get_script_prefix, get_urlconf, set_script_prefix
+    from django.urls import set_urlconf
+    from django.utils.translation import gettext_lazy as _
 except ImportError:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import (
+        get_script_prefix, get_urlconf, set_script_prefix, set_urlconf
+    )
+    from django.utils.translation import ugettext_lazy as _
+from django.utils import translation
+from django.utils.text import capfirst
 
+from admin_tools.cache import get_cache, make_key
+from admin_tools.dashboard.modules import Group
 from admin_tools.dashboard.registry import Registry
-from admin_tools.utils import get_admin_site
+from admin_tools.utils import (
+    get_admin_site, get_admin_site_entry, import_class, invalidate_user_state
+)
+
+
+class DashboardStream(object):
+    """
+    Collects the modules of a dashboard rendered by the streaming index
+    view, and the context needed to render them afterwards.
+    """
+
+    def __init__(self):
+        self.modules = []
+        self.context = None
 
 
 def get_dashboard(context, location):
@@ -29,23 +56,15 @@ def get_dashboard(context, location):
     raise ValueError('Invalid dashboard location: "%s"' % location)
 
 
-def _get_dashboard_cls(dashboard_cls, context):
+def _get_dashboard_cls(dashboard_cls, context, attr='index_dashboard'):
     if isinstance(dashboard_cls, dict):
-        curr_url = context.get('request').path
-        for key in dashboard_cls:
-            admin_site_mod, admin_site_inst = key.rsplit('.', 1)
-            admin_site_mod = import_module(admin_site_mod)
-            admin_site = getattr(admin_site_mod, admin_site_inst)
-            admin_url = reverse('%s:index' % admin_site.name)
-            if curr_url.startswith(admin_url):
-                mod, inst = dashboard_cls[key].rsplit('.', 1)
-                mod = import_module(mod)
-                return getattr(mod, inst)
-    else:
-        mod, inst = dashboard_cls.rsplit('.', 1)
-        mod = import_module(mod)
-        return getattr(mod, inst)
-    raise ValueError('Dashboard matching "%s" not found' % dashboard_cls)
+        entry = get_admin_site_entry(context.get('request'), attr)
+        if entry is None:
+            raise ValueError(
+                'Dashboard matching "%s" not found' % dashboard_cls
+            )
+        dashboard_cls = getattr(entry, attr)
+    return import_class(dashboard_cls)
 
 
 def get_index_dashboard(context):
@@ -89,4 +108,334 @@ def get_app_index_dashboard(context):
         settings,
         'ADMIN_TOOLS_APP_INDEX_DASHBOARD',
         'admin_tools.dashboard.dashboards.DefaultAppIndexDashboard'
-    ), context)(app_title, model_list)
+    ), context, 'app_index_dashboard')(app_title, model_list)
+
+
+def needs_jquery_ui(modules):
+    """
+    Returns ``True`` if one of the dashboard ``modules`` needs jQuery UI:
+    draggable modules and groups displayed in tabs or accordion.
+    Collapsing and deleting modules only need jQuery.
+    """
+    for module in modules:
+        if module.draggable:
+            return True
+        if isinstance(module, Group) and (
+                module.display in ('tabs', 'accordion') or
+                needs_jquery_ui(module.children)):
+            return True
+    return False
+
+
+def _is_str(value):
+    try:
+        return isinstance(value, basestring)
+    except NameError:
+        return isinstance(value, str)
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_id_map(value):
+    return isinstance(value, dict) and all(
+        isinstance(v, bool) for v in value.values()
+    )
+
+
+# dashboard preferences categories and their validators
+PREFERENCES_SCHEMA = {
+    'positions': lambda v: isinstance(v, list) and all(map(_is_str, v)),
+    'columns': lambda v: isinstance(v, list) and all(map(_is_int, v)),
+    'collapsed': _is_id_map,
+    'disabled': _is_id_map,
+}
+
+
+def clean_preferences(preferences):
+    """
+    Returns a copy of ``preferences`` without the unknown categories and
+    the invalid values.
+    """
+    if not isinstance(preferences, dict):
+        return {}
+    return dict(
+        (category, value) for category, value in preferences.items()
+        if category in PREFERENCES_SCHEMA and
+        PREFERENCES_SCHEMA[category](value)
+    )
+
+
+def validate_preferences(preferences):
+    """
+    Validates dashboard preferences against ``PREFERENCES_SCHEMA``.
+    """
+    if clean_preferences(preferences) != preferences:
+        raise ValidationError(
+            _('Invalid dashboard preferences.'), code='invalid'
+        )
+
+
+def prune_preferences(preferences, module_ids):
+    """
+    Returns a copy of ``preferences`` without the modules whose id is not
+    in ``module_ids`` (e.g. modules removed from the dashboard).
+    """
+    dom_ids = set('module_%s' % module_id for module_id in module_ids)
+    pruned = {}
+    for category, value in preferences.items():
+        if category == 'positions':
+            value = [dom_id for dom_id in value if dom_id in dom_ids]
+        elif isinstance(value, dict):
+            value = dict(
+                (dom_id, v) for dom_id, v in value.items() if dom_id in dom_ids
+            )
+        pruned[category] = value
+    return pruned
+
+
+def apply_preferences_patch(preferences, patch):
+    """
+    Applies a partial update of the dashboard preferences (as sent by the
+    dashboard javascript) to the ``preferences`` dict: ``positions`` and
+    ``columns`` are replaced, ``collapsed`` and ``disabled`` are merged
+    module by module. Empty objects (sent by the javascript for categories
+    that were never set) are ignored. Raises ``ValueError`` if the patch is
+    invalid.
+    """
+    if not isinstance(patch, dict):
+        raise ValueError('Invalid preferences patch')
+    for category, value in patch.items():
+        if category in PREFERENCES_SCHEMA and value == {}:
+            continue
+        if category not in PREFERENCES_SCHEMA or \
+                not PREFERENCES_SCHEMA[category](value):
+            raise ValueError('Invalid preferences: "%s"' % category)
+        if isinstance(value, dict) and \
+                isinstance(preferences.get(category), dict):
+            preferences[category].update(value)
+        else:
+            preferences[category] = value
+    return preferences
+
+
+def _preferences_changed(sender, instance, **kwargs):
+    # the cached state is deleted once the new preferences are visible to
+    # other requests, so that they cannot cache the previous ones again
+    user_pk = instance.user_id
+    transaction.on_commit(
+        lambda: invalidate_user_state(user_pk), using=kwargs.get('using')
+    )
+
+
+def _get_recent_actions_key(user_pk):
+    return make_key('recent_actions', user_pk)
+
+
+def _get_recent_actions_size():
+    return getattr(settings, 'ADMIN_TOOLS_RECENT_ACTIONS_CACHE_SIZE', None)
+
+
+def get_recent_actions(user):
+    """
+    Returns the list of the last log entries of ``user`` (most recent
+    first) kept in the cache if the ``ADMIN_TOOLS_RECENT_ACTIONS_CACHE_SIZE``
+    setting is set, ``None`` otherwise. The list holds at most that many
+    entries, it is fetched from the database on a cache miss and then kept
+    up to date when log entries are saved.
+    """
+    from django.contrib.admin.models import LogEntry
+
+    size = _get_recent_actions_size()
+    if not size or user is None or user.pk is None:
+        return None
+    cache = get_cache()
+    key = _get_recent_actions_key(user.pk)
+    entries = cache.get(key)
+    if entries is None:
+        entries = list(LogEntry.objects.filter(
+            user_id=user.pk
+        ).select_related('content_type')[:size])
+        # do not overwrite entries added by a concurrent save
+        cache.add(key, entries, None)
+    return entries
+
+
+def _add_recent_action(instance):
+    from django.contrib.contenttypes.models import ContentType
+
+    size = _get_recent_actions_size()
+    if not size:
+        return
+    cache = get_cache()
+    key = _get_recent_actions_key(instance.user_id)
+    entries = cache.get(key)
+    if entries is None:
+        # fetched from the database on the next render
+        return
+    if instance.content_type_id is not None:
+        # served by the content types cache, the rendered entries need it
+        instance.content_type = ContentType.objects.get_for_id(
+            instance.content_type_id
+        )
+    cache.set(key, ([instance] + entries)[:size], None)
+
+
+def _delete_recent_actions(user_pk):
+    get_cache().delete(_get_recent_actions_key(user_pk))
+
+
+def _log_entry_saved(sender, instance, created, **kwargs):
+    if not _get_recent_actions_size():
+        return
+    # the cache is updated once the entry is visible to other requests,
+    # entries of a rolled back transaction are never cached
+    if created:
+        transaction.on_commit(
+            lambda: _add_recent_action(instance), using=kwargs.get('using')
+        )
+    else:
+        user_pk = instance.user_id
+        transaction.on_commit(
+            lambda: _delete_recent_actions(user_pk),
+            using=kwargs.get('using')
+        )
+
+
+def _log_entry_deleted(sender, instance, **kwargs):
+    if not _get_recent_actions_size():
+        return
+    user_pk = instance.user_id
+    transaction.on_commit(
+        lambda: _delete_recent_actions(user_pk), using=kwargs.get('using')
+    )
+
+
+def connect_signals():
+    """
+    Connects the signal handlers invalidating the cached preferences of a
+    user when they change, and updating the cached recent actions of a user
+    when log entries are saved.
+    """
+    from django.contrib.admin.models import LogEntry
+    from admin_tools.dashboard.models import DashboardPreferences
+
+    for signal in (post_save, post_delete):
+        signal.connect(
+            _preferences_changed, sender=DashboardPreferences,
+            dispatch_uid='admin_tools.dashboard.preferences_changed'
+        )
+    post_save.connect(
+        _log_entry_saved, sender=LogEntry,
+        dispatch_uid='admin_tools.dashboard.log_entry_saved'
+    )
+    post_delete.connect(
+        _log_entry_deleted, sender=LogEntry,
+        dispatch_uid='admin_tools.dashboard.log_entry_deleted'
+    )
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    with _executors_lock:
+        if workers not in _executors:
+            _executors[workers] = ThreadPoolExecutor(workers)
+        return _executors[workers]
+
+
+def _get_modules_to_init(modules):
+    # the modules initialized before rendering: lazy and cached modules are
+    # only initialized if they are rendered, groups initialize themselves
+    for module in modules:
+        if isinstance(module, Group):
+            for child in _get_modules_to_init(module.children):
+                yield child
+        elif not (module._initialized or module.lazy or module.cache_timeout):
+            yield module
+
+
+def _copy_module(module):
+    clone = copy.copy(module)
+    clone.children = list(module.children)
+    clone.css_classes = list(module.css_classes)
+    return clone
+
+
+def _set_unavailable(module):
+    module.children = []
+    module.pre_content = _('This module is currently unavailable.')
+    module.css_classes.append('unavailable')
+
+
+def _init_module(module, context, language, urlconf, script_prefix):
+    # worker threads do not inherit the thread locals of the request
+    set_urlconf(urlconf)
+    set_script_prefix(script_prefix)
+    try:
+        with translation.override(language):
+            module.init_with_context(context)
+    finally:
+        set_urlconf(None)
+        connections.close_all()
+    return module
+
+
+def init_modules_concurrently(modules, context):
+    """
+    If the ``ADMIN_TOOLS_DASHBOARD_INIT_WORKERS`` setting is set, calls the
+    ``init_with_context`` method of the thread-safe ``modules`` (and of the
+    thread-safe children of groups) on a pool of that many threads.
+    Each module is initialized on a copy of itself that replaces it once
+    done, the modules that fail or exceed their ``init_timeout`` are
+    displayed as unavailable.
+    """
+    workers = getattr(settings, 'ADMIN_TOOLS_DASHBOARD_INIT_WORKERS', None)
+    if not workers or ThreadPoolExecutor is None:
+        return
+    modules = [m for m in _get_modules_to_init(modules) if m.thread_safe]
+    if not modules:
+        return
+
+    executor = _get_executor(workers)
+    start = time.time()
+    futures = []
+    for module in modules:
+        futures.append(executor.submit(
+            _init_module, _copy_module(module), context.new(context.flatten()),
+            translation.get_language(), get_urlconf(), get_script_prefix()
+        ))
+    for module, future in zip(modules, futures):
+        timeout = None
+        if module.init_timeout is not None:
+            timeout = max(0, start + module.init_timeout - time.time())
+        try:
+            clone = future.result(timeout)
+        except Exception:
+            future.cancel()
+            _set_unavailable(module)
+        else:
+            module.__dict__.update(clone.__dict__)
+        module._initialized = True
+
+
+def init_modules_async(modules, context):
+    """
+    If the ``ADMIN_TOOLS_ASYNC_INIT`` setting is set, awaits the
+    ``ainit_with_context`` coroutines of ``modules`` (and of the children of
+    groups) concurrently on the event loop and returns ``True``, otherwise
+    returns ``False``. Like with concurrent initialization, modules that
+    fail or exceed their ``init_timeout`` are displayed as unavailable.
+    """
+    if not getattr(settings, 'ADMIN_TOOLS_ASYNC_INIT', False):
+        return False
+    from asgiref.sync import async_to_sync
+    from admin_tools.async_utils import ainit_modules
+
+    modules = list(_get_modules_to_init(modules))
+    if modules:
+        async_to_sync(ainit_modules)(modules, context)
+    return True
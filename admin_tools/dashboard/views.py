@@ -1,6 +1,18 @@
+import json
+
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.http import (
+    Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden,
+    StreamingHttpResponse
+)
 from django.shortcuts import render
+from django.views.decorators.http import require_POST
+from django.template.loader import render_to_string
+from django.template.response import SimpleTemplateResponse
+from django.utils import translation
+from django.utils.safestring import mark_safe
 from django.contrib import messages
 
 try:
@@ -10,7 +22,12 @@ except ImportError:
 
 from .forms import DashboardPreferencesForm
 from .models import DashboardPreferences
-from admin_tools.utils import is_xhr
+from .modules import Group
+from .utils import (
+    DashboardStream, _is_str, apply_preferences_patch, get_dashboard,
+    prune_preferences
+)
+from admin_tools.utils import get_admin_site, get_request_cache, is_xhr
 
 
 @staff_member_required
@@ -48,3 +65,208 @@ def set_preferences(request, dashboard_id):
         "admin_tools/dashboard/preferences_form.html",
         context={"form": form},
     )
+
+
+def _get_module_ids(modules):
+    """
+    Returns the ids of the modules displayed by the dashboard from the list
+    of their DOM ids sent by the dashboard javascript.
+    """
+    if not isinstance(modules, list):
+        raise ValueError('Invalid modules')
+    module_ids = []
+    for dom_id in modules:
+        if not _is_str(dom_id) or not dom_id.startswith('module_'):
+            raise ValueError('Invalid modules')
+        module_ids.append(dom_id[len('module_'):])
+    return module_ids
+
+
+def _save_preferences_patch(user, dashboard_id, patch, module_ids=None):
+    field = DashboardPreferences._meta.get_field('data')
+    with transaction.atomic():
+        preferences = DashboardPreferences.objects.select_for_update().filter(
+            user=user, dashboard_id=dashboard_id
+        ).first()
+        if preferences is None:
+            preferences = DashboardPreferences(
+                user=user, dashboard_id=dashboard_id, data={}
+            )
+        data = apply_preferences_patch(dict(preferences.data or {}), patch)
+        if module_ids is not None:
+            # the state of the modules removed from the dashboard is dropped
+            # before the size of the preferences is checked
+            data = prune_preferences(data, module_ids)
+        preferences.data = field.clean(data, preferences)
+        if preferences.pk is None:
+            preferences.save(force_insert=True)
+        else:
+            preferences.save(update_fields=['data'])
+
+
+@staff_member_required
+@csrf_exempt
+@require_POST
+def patch_preferences(request, dashboard_id):
+    """
+    This view applies the partial update of the dashboard preferences sent
+    by the dashboard javascript in the ``patch`` POST parameter (see
+    ``apply_preferences_patch``), with a single write. The preferences of
+    the modules missing from the ``modules`` POST parameter (the DOM ids of
+    the displayed modules), if any, are removed.
+    """
+    try:
+        patch = json.loads(request.POST.get('patch', ''))
+        module_ids = None
+        if 'modules' in request.POST:
+            module_ids = _get_module_ids(
+                json.loads(request.POST['modules'])
+            )
+        try:
+            _save_preferences_patch(
+                request.user, dashboard_id, patch, module_ids
+            )
+        except IntegrityError:
+            # the preferences were created by a concurrent request
+            _save_preferences_patch(
+                request.user, dashboard_id, patch, module_ids
+            )
+    except (ValueError, ValidationError):
+        return HttpResponseBadRequest("false")
+    return HttpResponse("true")
+
+
+def _find_module(modules, module_id):
+    for module in modules:
+        if module.id == module_id:
+            return module
+        if isinstance(module, Group):
+            found = _find_module(module.children, module_id)
+            if found is not None:
+                return found
+    return None
+
+
+@staff_member_required
+def render_module(request, dashboard_id, module_id):
+    """
+    This view renders a single module of a dashboard, it is used by the
+    dashboard javascript to load lazy modules. The dashboard is retrieved
+    from the following GET parameters:
+
+    ``location``
+        The dashboard location, 'index' or 'app_index'.
+
+    ``path``
+        The path of the page displaying the dashboard, used to find its
+        admin site.
+
+    ``app_label``
+        The application label, for app index dashboards.
+    """
+    location = request.GET.get('location', 'index')
+    # resolve the admin site (and thus the dashboard) from the page path
+    get_request_cache(request)['path'] = request.GET.get('path', '')
+    context = {'request': request}
+    try:
+        admin_site = get_admin_site(request=request)
+    except ValueError:
+        raise Http404
+    # the path is supplied by the client
+    if not admin_site.has_permission(request):
+        return HttpResponseForbidden()
+    try:
+        if location == 'app_index':
+            app_label = request.GET.get('app_label')
+            context['app_list'] = [
+                app for app in admin_site.get_app_list(request)
+                if app['app_label'] == app_label
+            ]
+            if not context['app_list']:
+                raise Http404
+        dashboard = get_dashboard(context, location)
+    except ValueError:
+        raise Http404
+    if dashboard.get_id() != dashboard_id:
+        raise Http404
+
+    dashboard.init_with_context(context)
+    dashboard._prepare_children()
+    module = _find_module(dashboard.children, module_id)
+    if module is None:
+        raise Http404
+    context.update({
+        'dashboard': dashboard,
+        'dashboard_location': location,
+        'module': module,
+        'lazy_modules_loaded': True,
+    })
+    return render(
+        request,
+        "admin_tools/dashboard/module_fragment.html",
+        context=context,
+    )
+
+
+def _stream_modules(request, stream, head, tail, language, charset):
+    yield head
+    with translation.override(language):
+        for module in stream.modules:
+            context = dict(
+                stream.context, module=module, dashboard_stream=None
+            )
+            html = render_to_string(
+                "admin_tools/dashboard/module_fragment.html", context, request
+            )
+            yield render_to_string(
+                "admin_tools/dashboard/stream_module.html",
+                {"module": module, "module_html": mark_safe(html)},
+            ).encode(charset)
+    yield tail
+
+
+def streaming_index(request, extra_context=None):
+    """
+    Admin index view that sends the page with placeholders for the
+    dashboard modules first, and then each module as soon as it is
+    rendered. To use it, add it to your urls before the admin site::
+
+        from admin_tools.dashboard.views import streaming_index
+
+        urlpatterns = [
+            url(r'^admin/$', streaming_index),
+            url(r'^admin/', admin.site.urls),
+            # ...
+        ]
+    """
+    admin_site = get_admin_site(request=request)
+    stream = DashboardStream()
+    extra_context = dict(extra_context or {}, dashboard_stream=stream)
+    response = admin_site.admin_view(admin_site.index)(
+        request, extra_context=extra_context
+    )
+    if not isinstance(response, SimpleTemplateResponse):
+        # e.g. redirected to the login page
+        return response
+    response.render()
+    if stream.context is None:
+        # the index template does not render the dashboard
+        return response
+
+    # the modules are inserted at the end of the page body
+    split = response.content.rfind(b'</body>')
+    if split == -1:
+        split = len(response.content)
+    streaming_response = StreamingHttpResponse(
+        _stream_modules(
+            request, stream, response.content[:split],
+            response.content[split:], translation.get_language(),
+            response.charset
+        ),
+        status=response.status_code,
+    )
+    for header, value in response.items():
+        if header.lower() != 'content-length':
+            streaming_response[header] = value
+    streaming_response.cookies = response.cookies
+    return streaming_response
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from admin_tools.bundles import build_bundle
+
+
+class Command(BaseCommand):
+    help = (
+        "Bundles the admin tools javascript files in the static files "
+        "storage, run it after collectstatic."
+    )
+
+    def handle(self, **options):
+        manifest = build_bundle()
+        self.stdout.write(
+            'Bundled %d files in "%s".' % (
+                len(manifest['files']), manifest['name']
+            )
+        )
@@ -5,3 +5,9 @@ from django.apps import AppConfig
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'admin_tools.menu'
+
+    def ready(self):
+        super(MenuConfig, self).ready()
+        # invalidate cached menus when bookmarks change
+        from .utils import connect_signals
+        connect_signals()
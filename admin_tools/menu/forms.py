@@ -7,6 +7,7 @@ except ImportError:
 from django import forms
 
 from admin_tools.menu.models import Bookmark
+from admin_tools.menu.utils import normalize_url
 
 
 class BookmarkForm(forms.ModelForm):
@@ -20,8 +21,9 @@ class BookmarkForm(forms.ModelForm):
         self.user = user
 
     def clean_url(self):
+        # the url is sent urlencoded by the bookmark form
         url = self.cleaned_data['url']
-        return unquote(url)
+        return normalize_url(unquote(url))
 
     def save(self, *args, **kwargs):
         bookmark = super(BookmarkForm, self).save(
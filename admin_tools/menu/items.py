@@ -8,7 +8,7 @@ except ImportError:
     from django.core.urlresolvers import reverse
     from django.utils.translation import ugettext_lazy as _
 from django.utils.safestring import mark_safe
-from admin_tools.utils import AppListElementMixin
+from admin_tools.utils import AppListElementMixin, get_user_state
 
 
 class MenuItem(object):
@@ -58,6 +58,8 @@ class MenuItem(object):
     enabled = True
     template = 'admin_tools/menu/item.html'
     children = None
+    # boolean flag set once the item is initialized asynchronously
+    _initialized = False
 
     def __init__(self, title=None, url=None, **kwargs):
 
@@ -111,6 +113,19 @@ class MenuItem(object):
         """
         pass
 
+    def ainit_with_context(self, context):
+        """
+        Asynchronous counterpart of ``init_with_context``, used instead of it
+        when the ``ADMIN_TOOLS_ASYNC_INIT`` setting is set: the coroutines of
+        all the menu items are awaited concurrently before rendering. The
+        default implementation calls ``init_with_context`` in the thread of
+        the request, override it with an ``async def`` method to perform I/O
+        without holding a thread.
+        """
+        from admin_tools.async_utils import run_in_thread
+
+        return run_in_thread(self.init_with_context, context)
+
     def is_selected(self, request):
         """
         Helper method that returns ``True`` if the menu item is active.
@@ -119,7 +134,7 @@ class MenuItem(object):
         """
         current_url = request.get_full_path()
         return self.url == current_url or \
-            len([c for c in self.children if c.is_selected(request)]) > 0
+            any(c.is_selected(request) for c in self.children)
 
     def is_empty(self):
         """
@@ -130,6 +145,37 @@ class MenuItem(object):
         return False
 
 
+class CompactMenuItem(MenuItem):
+    """
+    A lightweight :class:`~admin_tools.menu.items.MenuItem` for the items
+    generated by the :class:`~admin_tools.menu.items.AppList` and
+    :class:`~admin_tools.menu.items.ModelList` menu items, which are
+    built for each request: the ``title``, ``url`` and ``children`` are
+    stored in slots and the other properties keep their default class
+    values, so the instances have no ``__dict__`` unless other attributes
+    are set. The ``css_classes`` list is created when it is first accessed.
+    """
+    __slots__ = ('title', 'url', 'children', '_css_classes')
+
+    _initialized = True
+
+    def __init__(self, title, url, children=None):
+        self.title = title
+        self.url = url
+        self.children = children if children is not None else []
+        self._css_classes = None
+
+    @property
+    def css_classes(self):
+        if self._css_classes is None:
+            self._css_classes = []
+        return self._css_classes
+
+    @css_classes.setter
+    def css_classes(self, value):
+        self._css_classes = value
+
+
 class AppList(MenuItem, AppListElementMixin):
     """
     A menu item that lists installed apps an their models.
@@ -196,24 +242,19 @@ class AppList(MenuItem, AppListElementMixin):
                 continue
             app_label = model._meta.app_label
             if app_label not in apps:
-                apps[app_label] = {
-                    'title':
-                        django_apps.get_app_config(app_label).verbose_name,
-                    'url': self._get_admin_app_list_url(model, context),
-                    'models': []
-                }
-            apps[app_label]['models'].append({
-                'title': model._meta.verbose_name_plural,
-                'url': self._get_admin_change_url(model, context)
-            })
+                apps[app_label] = CompactMenuItem(
+                    django_apps.get_app_config(app_label).verbose_name,
+                    self._get_admin_app_list_url(model, context)
+                )
+            apps[app_label].children.append(CompactMenuItem(
+                model._meta.verbose_name_plural,
+                self._get_admin_change_url(model, context)
+            ))
 
         for app in sorted(apps.keys()):
-            app_dict = apps[app]
-            item = MenuItem(title=app_dict['title'], url=app_dict['url'])
+            item = apps[app]
             # sort model list alphabetically
-            apps[app]['models'].sort(key=lambda x: x['title'])
-            for model_dict in apps[app]['models']:
-                item.children.append(MenuItem(**model_dict))
+            item.children.sort(key=lambda x: x.title)
             self.children.append(item)
 
     def is_empty(self):
@@ -295,8 +336,7 @@ class ModelList(MenuItem, AppListElementMixin):
                 continue
             title = model._meta.verbose_name_plural
             url = self._get_admin_change_url(model, context)
-            item = MenuItem(title=title, url=url)
-            self.children.append(item)
+            self.children.append(CompactMenuItem(title, url))
 
     def is_empty(self):
         """
@@ -346,10 +386,9 @@ class Bookmarks(MenuItem, AppListElementMixin):
         :meth:`~admin_tools.menu.items.MenuItem.init_with_context`
         documentation from :class:`~admin_tools.menu.items.MenuItem` class.
         """
-        from admin_tools.menu.models import Bookmark
-
-        for b in Bookmark.objects.filter(user=context['request'].user):
-            self.children.append(MenuItem(mark_safe(b.title), b.url))
+        bookmarks = get_user_state(context['request'])['bookmarks']
+        for bookmark_id, title, url in bookmarks:
+            self.children.append(MenuItem(mark_safe(title), url))
 
         if not len(self.children):
             self.enabled = False
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    from urllib.parse import parse_qsl, urlsplit, urlunsplit
+except ImportError:
+    # Python 2 compatibility
+    from urlparse import parse_qsl, urlsplit, urlunsplit
+
+from django.db import models, migrations
+from django.utils.http import urlencode
+
+
+# frozen copy of admin_tools.menu.utils.normalize_url
+def normalize_url(url):
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def normalize_urls(apps, schema_editor):
+    """
+    Stores the existing bookmark URLs in their normalized form.
+    """
+    Bookmark = apps.get_model('menu', 'Bookmark')
+    for pk, url in Bookmark.objects.values_list('pk', 'url'):
+        normalized = normalize_url(url)
+        if normalized != url:
+            Bookmark.objects.filter(pk=pk).update(url=normalized[:255])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_urls, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='bookmark',
+            index=models.Index(fields=['user', 'url'], name='admin_tools_menu_user_url_idx'),
+        ),
+    ]
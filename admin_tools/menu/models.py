@@ -32,6 +32,11 @@ class Bookmark(models.Model):
     class Meta:
         db_table = 'admin_tools_menu_bookmark'
         ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['user', 'url'], name='admin_tools_menu_user_url_idx'
+            ),
+        ]
 
 
 class Menu(
@@ -46,3 +46,44 @@ var process_bookmarks = function(url, title, prompt_msg) {
         }
     });
 };
+
+/**
+ * Replaces the navigation menu placeholder by the menu of the user, kept in
+ * the browser local storage until its version changes.
+ *
+ * @param string url The current page url path (request.get_full_path)
+ * @return void
+ */
+var load_menu = function(url) {
+    var $ = jQuery;
+    var placeholder = $('#navigation-menu[data-menu-url]');
+    var version = placeholder.attr('data-menu-version');
+    var key = 'admin-tools.menu';
+    var render = function(menu) {
+        var html = menu.html.replace(
+            /__admin_tools_selected_(\d+)__/g,
+            function(marker, index) {
+                return $.inArray(url, menu.selection[index]) != -1 ? ' selected' : '';
+            }
+        );
+        placeholder.replaceWith(html);
+    };
+    var menu = null;
+    try {
+        menu = JSON.parse(window.localStorage.getItem(key));
+    } catch (e) {
+        // local storage is disabled or the stored menu is invalid
+    }
+    if (menu && menu.version == version) {
+        render(menu);
+        return;
+    }
+    $.getJSON(placeholder.attr('data-menu-url'), function(menu) {
+        try {
+            window.localStorage.setItem(key, JSON.stringify(menu));
+        } catch (e) {
+            // local storage is disabled or full
+        }
+        render(menu);
+    });
+};
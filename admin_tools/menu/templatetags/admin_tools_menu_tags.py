@@ -8,16 +8,35 @@ Menu template tags, the following menu tags are available:
 To load the menu tags in your templates: ``{% load admin_tools_menu_tags %}``.
 """
 
+import re
+
 from django import template
+from django.template import Engine
+from django.conf import settings
 try:
     from django.urls import reverse
 except ImportError:
     from django.core.urlresolvers import reverse
+try:
+    from django.utils.encoding import force_str
+except ImportError:
+    from django.utils.encoding import force_text as force_str
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
 
-from admin_tools.utils import get_admin_site_name
+from admin_tools.bundles import get_bundle_scripts, use_modern_assets
+from admin_tools.cache import (
+    get_cache, get_permissions_version, get_versions, make_key
+)
+from admin_tools.utils import (
+    get_admin_site_name, get_admin_url, get_request_cache, get_user_state
+)
 from admin_tools.menu import items
 from admin_tools.menu.models import Bookmark
-from admin_tools.menu.utils import get_admin_menu
+from admin_tools.menu.utils import (
+    get_admin_menu, get_selected_items, normalize_url
+)
 
 register = template.Library()
 tag_func = register.inclusion_tag(
@@ -25,53 +44,244 @@ tag_func = register.inclusion_tag(
     takes_context=True
 )
 
+_SELECTED_MARKER = '__admin_tools_selected_%d__'
+_SELECTED_MARKER_RE = re.compile(r'__admin_tools_selected_(\d+)__')
+
+
+def _get_menu_cache_key(menu, context):
+    user = context['request'].user
+    return make_key(
+        'menu',
+        '%s.%s' % (menu.__class__.__module__, menu.__class__.__name__),
+        user.pk,
+        get_permissions_version(user),
+        get_admin_site_name(context),
+        get_language(),
+        *get_versions('bookmarks:%s' % user.pk)
+    )
+
+
+def _get_selection_urls(item):
+    """
+    Returns the URLs for which ``item`` is selected, following the
+    ``MenuItem.is_selected`` rules.
+    """
+    if isinstance(item, items.Bookmarks):
+        return set()
+    urls = set([force_str(item.url)])
+    for child in item.children:
+        urls |= _get_selection_urls(child)
+    return urls
+
+
+def _init_menu(menu, context):
+    menu.init_with_context(context)
+    if getattr(settings, 'ADMIN_TOOLS_ASYNC_INIT', False):
+        from asgiref.sync import async_to_sync
+        from admin_tools.async_utils import ainit_menu_items
+
+        async_to_sync(ainit_menu_items)(menu.children, context)
+
+
+def _init_menu_items(items, context):
+    """
+    Initializes the menu ``items`` and their children (including the
+    children created by the initialization of their parent).
+    """
+    stack = list(reversed(items))
+    while stack:
+        item = stack.pop()
+        if not item._initialized:
+            item.init_with_context(context)
+            item._initialized = True
+        stack.extend(reversed(item.children))
+
+
+def _render_navigation(menu, context):
+    """
+    Renders the navigation tree of an initialized ``menu``, the selected
+    state of the items is replaced by markers, returns the html and the list
+    of selection URLs of each marker.
+    """
+    if not menu.children:
+        return '', []
+    selection = []
+    if context.template is not None:
+        engine = context.template.engine
+    else:
+        # rendering outside of a template, e.g. by the menu view
+        engine = Engine.get_default()
+    navigation = engine.get_template('admin_tools/menu/navigation.html')
+    values = context.flatten()
+    values.update({'menu': menu, 'menu_selection': selection})
+    return navigation.render(context.new(values)), selection
+
+
+def _get_navigation(menu, context):
+    """
+    Returns the navigation html of ``menu`` with selection markers, the
+    selection URLs of each marker and whether the menu has a bookmarks
+    item. They are served from the cache if the
+    ``ADMIN_TOOLS_MENU_CACHE_TIMEOUT`` setting is set.
+    """
+    timeout = getattr(settings, 'ADMIN_TOOLS_MENU_CACHE_TIMEOUT', None)
+    if timeout:
+        cache = get_cache()
+        key = _get_menu_cache_key(menu, context)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    _init_menu(menu, context)
+    html, selection = _render_navigation(menu, context)
+    cached = (html, selection, _has_bookmark_item(menu))
+    if timeout:
+        cache.set(key, cached, timeout)
+    return cached
+
+
+def _get_menu_version(menu, context):
+    """
+    Returns a string that changes whenever the navigation menu of the user
+    may change (see ``_get_menu_cache_key``).
+    """
+    return _get_menu_cache_key(menu, context).rsplit(':', 1)[1]
+
+
+def _get_has_bookmark_item(menu, context, version):
+    # menus usually build their items in init_with_context, the result is
+    # cached to skip building the menu while its version does not change
+    cache = get_cache()
+    key = make_key('menu_has_bookmark_item', version)
+    has_bookmark_item = cache.get(key)
+    if has_bookmark_item is None:
+        _init_menu(menu, context)
+        has_bookmark_item = _has_bookmark_item(menu)
+        cache.set(key, has_bookmark_item, None)
+    return has_bookmark_item
+
 
 def admin_tools_render_menu(context, menu=None):
     """
     Template tag that renders the menu, it takes an optional ``Menu`` instance
     as unique argument, if not given, the menu will be retrieved with the
     ``get_admin_menu`` function.
+
+    If the ``ADMIN_TOOLS_MENU_CACHE_TIMEOUT`` setting is set, the navigation
+    tree is rendered once per user, permissions, admin site and language and
+    then served from the cache, only the selected items depend on the
+    current URL.
+
+    If the ``ADMIN_TOOLS_MENU_CLIENT_CACHE`` setting is set, the navigation
+    tree is not rendered in the page: the menu javascript loads it from the
+    ``admin-tools-menu`` view and keeps it in the browser local storage
+    until the menu version changes.
     """
     if menu is None:
         menu = get_admin_menu(context)
 
-    menu.init_with_context(context)
-    has_bookmark_item = False
+    request = context['request']
+    menu_html = menu_url = menu_version = menu_selected = None
+    if getattr(settings, 'ADMIN_TOOLS_MENU_CLIENT_CACHE', False):
+        menu_version = _get_menu_version(menu, context)
+        menu_url = '%s?%s' % (
+            reverse('admin-tools-menu'), urlencode({'path': request.path})
+        )
+        has_bookmark_item = _get_has_bookmark_item(
+            menu, context, menu_version
+        )
+    elif getattr(settings, 'ADMIN_TOOLS_MENU_CACHE_TIMEOUT', None):
+        html, selection, has_bookmark_item = _get_navigation(menu, context)
+        url = request.get_full_path()
+        menu_html = mark_safe(_SELECTED_MARKER_RE.sub(
+            lambda m: ' selected' if url in selection[int(m.group(1))] else '',
+            html
+        ))
+    else:
+        _init_menu(menu, context)
+        # the items are initialized first to compute the selected items
+        # in a single pass over the tree
+        _init_menu_items(menu.children, context)
+        menu_selected = get_selected_items(menu.children, request)
+        has_bookmark_item = _has_bookmark_item(menu)
+
     bookmark = None
-    if len([c for c in menu.children if isinstance(c, items.Bookmarks)]) > 0:
-        has_bookmark_item = True
-        url = context['request'].get_full_path()
-        try:
-            bookmark = Bookmark.objects.filter(
-                user=context['request'].user, url=url
-            )[0]
-        except:
-            pass
+    if has_bookmark_item:
+        bookmark = _get_bookmark(request)
 
     context.update({
         'template': menu.template,
         'menu': menu,
+        'menu_html': menu_html,
+        'menu_selected': menu_selected,
+        'menu_url': menu_url,
+        'menu_version': menu_version,
         'has_bookmark_item': has_bookmark_item,
         'bookmark': bookmark,
-        'admin_url': reverse('%s:index' % get_admin_site_name(context)),
+        'modern_assets': use_modern_assets(),
+        'bundle_scripts': get_bundle_scripts(request, menu.Media.js),
+        'admin_url': get_admin_url(get_admin_site_name(context), 'index'),
     })
     return context
 admin_tools_render_menu = tag_func(admin_tools_render_menu)
 
 
+def _get_bookmark(request):
+    """
+    Returns the bookmark of the current page (or ``None``), looked up in the
+    bookmarks preloaded by ``get_user_state``, indexed by URL.
+    """
+    request_cache = get_request_cache(request)
+    if 'bookmarks_by_url' not in request_cache:
+        index = {}
+        for bookmark in reversed(get_user_state(request)['bookmarks']):
+            # the first bookmark of a URL wins
+            index[bookmark[2]] = bookmark
+        request_cache['bookmarks_by_url'] = index
+    bookmark = request_cache['bookmarks_by_url'].get(
+        normalize_url(request.get_full_path())
+    )
+    if bookmark is None:
+        return None
+    bookmark_id, title, url = bookmark
+    return Bookmark(
+        id=bookmark_id, user_id=request.user.pk, title=title, url=url
+    )
+
+
+def _has_bookmark_item(menu):
+    return len(
+        [c for c in menu.children if isinstance(c, items.Bookmarks)]
+    ) > 0
+
+
 def admin_tools_render_menu_item(context, item, index=None):
     """
     Template tag that renders a given menu item, it takes a ``MenuItem``
     instance as unique parameter.
     """
-    item.init_with_context(context)
+    if not item._initialized:
+        item.init_with_context(context)
+
+    selection = context.get('menu_selection')
+    if selection is None:
+        # computed by admin_tools_render_menu for the items of the menu
+        selected = (context.get('menu_selected') or {}).get(id(item))
+        if selected is None:
+            selected = item.is_selected(context['request'])
+        selected_marker = None
+    else:
+        # rendering for the menu cache
+        selected = False
+        selected_marker = _SELECTED_MARKER % len(selection)
+        selection.append(_get_selection_urls(item))
 
     context.update({
         'template': item.template,
         'item': item,
         'index': index,
-        'selected': item.is_selected(context['request']),
-        'admin_url': reverse('%s:index' % get_admin_site_name(context)),
+        'selected': selected,
+        'selected_marker': selected_marker,
+        'admin_url': get_admin_url(get_admin_site_name(context), 'index'),
     })
     return context
 admin_tools_render_menu_item = tag_func(admin_tools_render_menu_item)
@@ -89,6 +299,7 @@ def admin_tools_render_menu_css(context, menu=None):
     context.update({
         'template': 'admin_tools/menu/css.html',
         'css_files': menu.Media.css,
+        'modern_assets': use_modern_assets(),
     })
     return context
 admin_tools_render_menu_css = tag_func(admin_tools_render_menu_css)
@@ -1,5 +1,11 @@
 from tempfile import mktemp
-from django.test import TestCase
+from unittest import skipUnless
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+from django.template import Context
+from django.test import RequestFactory, TestCase
 from django.core import management
 
 try:
@@ -8,8 +14,11 @@ except ImportError:
     from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
 
-from admin_tools.menu.items import AppList
+from admin_tools.menu.items import (
+    AppList, Bookmarks, CompactMenuItem, MenuItem, ModelList
+)
 from admin_tools.menu.models import Bookmark
+from admin_tools.menu.utils import get_selected_items, normalize_url
 
 
 class ManagementCommandTest(TestCase):
@@ -62,4 +71,154 @@ class DeleteBookMarkTest(TestCase):
         self.assertEqual(Bookmark.objects.first(), self.bookmark)
 
 
-__test__ = {"AppList.is_empty": AppList.is_empty}
+class SelectedItemsTest(TestCase):
+    def _get_request(self, path):
+        request = RequestFactory().get(path)
+        calls = []
+        get_full_path = request.get_full_path
+
+        def counted_get_full_path():
+            calls.append(1)
+            return get_full_path()
+        request.get_full_path = counted_get_full_path
+        return request, calls
+
+    def _get_menu(self):
+        # 20 * (1 + 10 * (1 + 9)) = 2020 items
+        return [
+            MenuItem('item %d' % i, '/%d/' % i, children=[
+                MenuItem('item %d.%d' % (i, j), '/%d/%d/' % (i, j), children=[
+                    MenuItem(
+                        'item %d.%d.%d' % (i, j, k), '/%d/%d/%d/' % (i, j, k)
+                    )
+                    for k in range(9)
+                ])
+                for j in range(10)
+            ])
+            for i in range(20)
+        ]
+
+    def _walk(self, items):
+        for item in items:
+            yield item
+            for child in self._walk(item.children):
+                yield child
+
+    def test_selected_items(self):
+        menu = self._get_menu()
+        request, calls = self._get_request('/19/9/8/')
+        expected = dict(
+            (id(item), item.is_selected(request))
+            for item in self._walk(menu)
+        )
+        recursive_calls = len(calls)
+
+        del calls[:]
+        selected = get_selected_items(menu, request)
+        self.assertEqual(len(selected), 2020)
+        self.assertEqual(selected, expected)
+        self.assertEqual(
+            [item.title for item in self._walk(menu) if selected[id(item)]],
+            ['item 19', 'item 19.9', 'item 19.9.8']
+        )
+        # the current URL is computed once instead of once per visited item
+        self.assertEqual(len(calls), 1)
+        self.assertGreater(recursive_calls, 2020)
+
+    def test_custom_is_selected(self):
+        bookmarks = Bookmarks(children=[MenuItem('bookmark', '/bookmark/')])
+        menu = [MenuItem('menu', '/menu/', children=[bookmarks])]
+        request, calls = self._get_request('/bookmark/')
+        selected = get_selected_items(menu, request)
+        # bookmarks do not select their ancestors
+        self.assertEqual(
+            [item.title for item in self._walk(menu) if selected[id(item)]],
+            ['bookmark']
+        )
+        self.assertEqual(selected, dict(
+            (id(item), item.is_selected(request))
+            for item in self._walk(menu)
+        ))
+
+
+class MenuItemTest(TestCase):
+    def test_subclass_without_super_init(self):
+        from admin_tools.menu.templatetags.admin_tools_menu_tags import (
+            _init_menu_items
+        )
+
+        class CustomItem(MenuItem):
+            def __init__(self, title):
+                self.title = title
+                self.children = []
+
+            def init_with_context(self, context):
+                self.children.append(MenuItem('child'))
+
+        item = CustomItem('custom')
+        self.assertFalse(item._initialized)
+        _init_menu_items([item], Context())
+        self.assertTrue(item._initialized)
+        self.assertEqual([c.title for c in item.children], ['child'])
+        self.assertTrue(item.children[0]._initialized)
+
+
+class CompactMenuItemTest(TestCase):
+    def setUp(self):
+        request = RequestFactory().get('/admin/auth/user/')
+        request.user = User.objects.create(
+            username='superuser', is_staff=True, is_superuser=True
+        )
+        self.request = request
+        self.context = Context({'request': request})
+
+    def test_app_list(self):
+        item = AppList(models=['django.contrib.auth.*'])
+        item.init_with_context(self.context)
+        app = item.children[0]
+        self.assertIsInstance(app, CompactMenuItem)
+        self.assertIsInstance(app, MenuItem)
+        self.assertEqual(
+            (app.title, app.url), ('Authentication and Authorization',
+                                   '/admin/auth/')
+        )
+        self.assertEqual(
+            [(c.title, c.url, c.children) for c in app.children],
+            [('groups', '/admin/auth/group/', []),
+             ('users', '/admin/auth/user/', [])]
+        )
+        self.assertEqual(app.css_classes, [])
+        app.css_classes.append('app')
+        self.assertEqual(app.css_classes, ['app'])
+        self.assertTrue(app.enabled)
+        self.assertFalse(app.is_empty())
+        self.assertTrue(app.is_selected(self.request))
+
+        item = ModelList(models=['django.contrib.auth.models.User'])
+        item.init_with_context(self.context)
+        self.assertEqual(
+            [(c.title, c.url) for c in item.children],
+            [('users', '/admin/auth/user/')]
+        )
+        self.assertIsInstance(item.children[0], CompactMenuItem)
+
+    def _measure(self, cls):
+        values = [('model %d' % i, '/model/%d/' % i) for i in range(1000)]
+        tracemalloc.start()
+        try:
+            items = [cls(title, url) for title, url in values]
+            return tracemalloc.get_traced_memory()[0], items
+        finally:
+            tracemalloc.stop()
+
+    @skipUnless(tracemalloc, 'tracemalloc is not available')
+    def test_memory(self):
+        items_size, items = self._measure(MenuItem)
+        compact_size, compact_items = self._measure(CompactMenuItem)
+        self.assertLess(compact_size, items_size * 0.8)
+
+
+__test__ = {
+    "AppList.is_empty": AppList.is_empty,
+    "normalize_url": normalize_url,
+}
@@ -7,6 +7,11 @@ else:
 from admin_tools.menu import views
 
 urlpatterns = [
+    url(
+        r'^menu/$',
+        views.render_menu,
+        name='admin-tools-menu'
+    ),
     url(
         r'^add_bookmark/$',
         views.add_bookmark,
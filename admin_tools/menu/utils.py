@@ -1,36 +1,32 @@
 """
 Menu utilities.
 """
-
-from django.conf import settings
-try:
-    from importlib import import_module
-except ImportError:
-    # Django < 1.9 and Python < 2.7
-    from django.utils.importlib import import_module
 try:
-    from django.urls import reverse
+    from urllib.parse import parse_qsl, urlsplit, urlunsplit
 except ImportError:
-    from django.core.urlresolvers import reverse
+    # Python 2 compatibility
+    from urlparse import parse_qsl, urlsplit, urlunsplit
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.utils.http import urlencode
+
+from admin_tools.cache import bump_version
+from admin_tools.utils import (
+    get_admin_site_entry, import_class, invalidate_user_state
+)
 
 
 def _get_menu_cls(menu_cls, context):
     if isinstance(menu_cls, dict):
-        curr_url = context.get('request').path
-        for key in menu_cls:
-            admin_site_mod, admin_site_inst = key.rsplit('.', 1)
-            admin_site_mod = import_module(admin_site_mod)
-            admin_site = getattr(admin_site_mod, admin_site_inst)
-            admin_url = reverse('%s:index' % admin_site.name)
-            if curr_url.startswith(admin_url):
-                mod, inst = menu_cls[key].rsplit('.', 1)
-                mod = import_module(mod)
-                return getattr(mod, inst)
-    else:
-        mod, inst = menu_cls.rsplit('.', 1)
-        mod = import_module(mod)
-        return getattr(mod, inst)
-    raise ValueError('Dashboard menu matching "%s" not found' % menu_cls)
+        entry = get_admin_site_entry(context.get('request'), 'menu')
+        if entry is None:
+            raise ValueError(
+                'Dashboard menu matching "%s" not found' % menu_cls
+            )
+        menu_cls = entry.menu
+    return import_class(menu_cls)
 
 
 def get_admin_menu(context):
@@ -42,3 +38,80 @@ def get_admin_menu(context):
         'ADMIN_TOOLS_MENU',
         'admin_tools.menu.DefaultMenu'
     ), context)()
+
+
+def get_selected_items(items, request):
+    """
+    Returns a dict mapping the ids of the menu ``items`` and of their
+    descendants to their selected state for ``request``, following the
+    ``MenuItem.is_selected`` rules: an item is selected if its URL or the
+    URL of one of its descendants is the current URL. The tree is walked
+    once, indexing the ancestors of the items by URL, instead of calling
+    ``is_selected`` on every item (which walks the subtree of the item each
+    time). Items that override ``is_selected`` are selected according to
+    their own rules.
+    """
+    from admin_tools.menu.items import MenuItem
+
+    url = request.get_full_path()
+    index = {}
+    selected = {}
+    stack = [(item, ()) for item in items]
+    while stack:
+        item, ancestors = stack.pop()
+        selected.setdefault(id(item), False)
+        if type(item).is_selected is not MenuItem.is_selected:
+            if item.is_selected(request):
+                selected[id(item)] = True
+                selected.update((id(a), True) for a in ancestors)
+            # the descendants do not select the ancestors of the item
+            ancestors = ()
+        else:
+            ancestors = ancestors + (item,)
+            index.setdefault(item.url, []).append(ancestors)
+        stack.extend((child, ancestors) for child in item.children)
+    for path in index.get(url, ()):
+        selected.update((id(item), True) for item in path)
+    return selected
+
+
+def normalize_url(url):
+    """
+    Returns the normalized form of ``url`` used to store and look up
+    bookmarks: its fragment is dropped and its query parameters are sorted
+    and encoded consistently, so that bookmarked URLs match the current URL
+    exactly. The encoded characters of the query values are kept.
+
+    >>> from admin_tools.menu.utils import normalize_url
+    >>> normalize_url('/admin/auth/user/?o=1&is_staff__exact=1#top')
+    '/admin/auth/user/?is_staff__exact=1&o=1'
+    >>> normalize_url('/admin/auth/user/?q=%23x%26y&o=')
+    '/admin/auth/user/?o=&q=%23x%26y'
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def _bookmark_changed(sender, instance, **kwargs):
+    user_pk = instance.user_id
+
+    def invalidate():
+        bump_version('bookmarks:%s' % user_pk)
+        invalidate_user_state(user_pk)
+    # see admin_tools.dashboard.utils._preferences_changed
+    transaction.on_commit(invalidate, using=kwargs.get('using'))
+
+
+def connect_signals():
+    """
+    Connects the signal handlers invalidating the cached menus of a user
+    when its bookmarks change.
+    """
+    from admin_tools.menu.models import Bookmark
+
+    for signal in (post_save, post_delete):
+        signal.connect(
+            _bookmark_changed, sender=Bookmark,
+            dispatch_uid='admin_tools.menu.bookmark_changed'
+        )
@@ -1,6 +1,11 @@
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified,
+    HttpResponseRedirect, JsonResponse
+)
 from django.shortcuts import get_object_or_404, render
+from django.template import Context
+from django.utils.cache import patch_cache_control
 from django.contrib import messages
 
 try:
@@ -10,7 +15,54 @@ except ImportError:
 
 from .forms import BookmarkForm
 from .models import Bookmark
-from admin_tools.utils import is_xhr
+from .templatetags.admin_tools_menu_tags import (
+    _get_menu_version, _get_navigation
+)
+from .utils import get_admin_menu
+from admin_tools.utils import get_admin_site, get_request_cache, is_xhr
+
+
+def _set_menu_cache_headers(response, etag):
+    response['ETag'] = etag
+    # the browser must check that the menu version did not change
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@staff_member_required
+def render_menu(request):
+    """
+    This view returns the navigation menu of the user as JSON, it is used
+    by the menu javascript when the ``ADMIN_TOOLS_MENU_CLIENT_CACHE`` setting
+    is set. The response contains the menu ``version``, its ``html`` with
+    selection markers and, for each marker, the list of URLs for which the
+    item is selected (``selection``). The ``path`` GET parameter is the path
+    of the page displaying the menu, used to find its admin site.
+
+    The ETag of the response is the menu version, the menu is not built if
+    the browser already has the current version.
+    """
+    # resolve the admin site (and thus the menu) from the page path
+    get_request_cache(request)['path'] = request.GET.get('path', '')
+    try:
+        admin_site = get_admin_site(request=request)
+    except ValueError:
+        raise Http404
+    # the path is supplied by the client
+    if not admin_site.has_permission(request):
+        return HttpResponseForbidden()
+    context = Context({'request': request})
+    menu = get_admin_menu(context)
+    version = _get_menu_version(menu, context)
+    etag = '"%s"' % version
+    if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        return _set_menu_cache_headers(HttpResponseNotModified(), etag)
+    html, selection, has_bookmark_item = _get_navigation(menu, context)
+    return _set_menu_cache_headers(JsonResponse({
+        'version': version,
+        'html': html,
+        'selection': [sorted(urls) for urls in selection],
+    }), etag)
 
 
 @staff_member_required
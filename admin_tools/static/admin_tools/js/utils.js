@@ -22,17 +22,23 @@ var loadScripts = function(js_files, onComplete){
             var s = document.createElement('script');
             s.src = js_files[index].src;
             s.type = 'text/javascript';
-            head.appendChild(s);
-            if (/MSIE/.test(navigator.userAgent)) {
-                // Internet Explorer
+            var loaded = false;
+            var next = function() {
+                if (!loaded) {
+                    loaded = true;
+                    loadScript(index+1);
+                }
+            };
+            s.onload = next;
+            if ('readyState' in s) {
+                // old Internet Explorer versions, without onload
                 s.onreadystatechange = function () {
                     if (s.readyState == 'loaded' || s.readyState == 'complete') {
-                        loadScript(index+1);
+                        next();
                     }
                 };
-            } else {
-                s.onload = function() { loadScript(index+1); };
             }
+            head.appendChild(s);
         } else {
             loadScript(index+1);
         }
@@ -1,6 +1,7 @@
 from __future__ import with_statement
 import warnings
 from unittest import TestCase
+from django.test import TestCase as DjangoTestCase
 
 
 class DeprecationTest(TestCase):
@@ -70,3 +71,336 @@ class DeprecationTest(TestCase):
         self.assertNotDeprecated(items.MenuItem)
         self.assertNotDeprecated(items.AppList)
         self.assertNotDeprecated(items.Bookmarks)
+
+
+def _legacy_filter_models(items, models, exclude):
+    # the original pattern x models implementation of filter_models, kept
+    # as a reference for the compiled matcher
+    from fnmatch import fnmatch
+
+    def full_name(model):
+        return '%s.%s' % (model.__module__, model.__name__)
+
+    included = []
+    if len(models) == 0:
+        included = items
+    else:
+        for pattern in models:
+            wildcard_models = []
+            for item in items:
+                model_str = full_name(item[0])
+                if model_str == pattern:
+                    included.append(item)
+                elif fnmatch(model_str, pattern) and \
+                        item not in wildcard_models:
+                    wildcard_models.append(item)
+            if wildcard_models:
+                wildcard_models.sort(
+                    key=lambda x: x[0]._meta.verbose_name_plural
+                )
+                included += wildcard_models
+    result = included[:]
+    for pattern in exclude:
+        for item in included:
+            if fnmatch(full_name(item[0]), pattern):
+                try:
+                    result.remove(item)
+                except ValueError:
+                    pass
+    return result
+
+
+def _synthetic_registry(size):
+    # fake (model, perms) items spread over a few packages and apps, the way
+    # a large project registry looks like
+    class Meta(object):
+        def __init__(self, verbose_name_plural):
+            self.verbose_name_plural = verbose_name_plural
+
+    items = []
+    packages = ('django.contrib', 'project', 'vendor.plugins')
+    for i in range(size):
+        module = '%s.app%d.models' % (packages[i % 3], i % 37)
+        model = type('Model%d' % i, (object,), {
+            '__module__': module,
+            '_meta': Meta('model %d' % ((i * 7919) % size)),
+        })
+        items.append((model, {'add': True, 'change': True}))
+    return items
+
+
+class FilterModelsTest(TestCase):
+    patterns = (
+        ([], []),
+        (['*'], []),
+        ([], ['django.contrib.*']),
+        (['django.contrib.*'], []),
+        (['project.app1.models.Model1', '*.Model2*', 'project.*'],
+         ['project.app1*', '*.Model3']),
+        (['vendor.plugins.app?.models.*', 'django.contrib.app1.*'],
+         ['*app2*']),
+        (['project.app[12].*', 'nothing.matches.*'], ['*.Model4']),
+    )
+
+    def test_matches_legacy_implementation(self):
+        from admin_tools.utils import get_model_matcher
+
+        items = _synthetic_registry(1000)
+        for models, exclude in self.patterns:
+            self.assertEqual(
+                get_model_matcher(models, exclude).filter(items),
+                _legacy_filter_models(items, models, exclude),
+            )
+
+    def test_matcher_is_cached(self):
+        from admin_tools.utils import get_model_matcher
+
+        self.assertIs(
+            get_model_matcher(['django.contrib.*'], ['*.User']),
+            get_model_matcher(('django.contrib.*',), ('*.User',)),
+        )
+
+    def test_default_calls(self):
+        # the filter_models calls of the default menu + dashboard against
+        # large synthetic registries
+        from admin_tools.utils import get_model_matcher
+
+        calls = (
+            (['django.contrib.*'], []),
+            ([], ['django.contrib.*']),
+        )
+        for size in (1000, 5000):
+            items = _synthetic_registry(size)
+            for models, exclude in calls:
+                self.assertEqual(
+                    get_model_matcher(models, exclude).filter(items),
+                    _legacy_filter_models(items, models, exclude),
+                )
+
+
+class AvailModelsTest(DjangoTestCase):
+    fixtures = ['users.json']
+
+    def test_sweep_once_per_request(self):
+        from django.contrib import admin
+        from django.contrib.auth.models import User
+        from django.test import RequestFactory
+        from admin_tools.utils import filter_models
+
+        request = RequestFactory().get('/admin/')
+        request.user = User.objects.get(username='superuser')
+        calls = []
+        for model_admin in admin.site._registry.values():
+            model_admin.get_model_perms = (
+                lambda request, get_perms=model_admin.get_model_perms:
+                calls.append(1) or get_perms(request)
+            )
+        try:
+            filter_models(request, ['django.contrib.*'], [])
+            filter_models(request, [], ['django.contrib.*'])
+            filter_models(request, ['*.Foo'], [])
+        finally:
+            for model_admin in admin.site._registry.values():
+                del model_admin.get_model_perms
+        self.assertEqual(len(calls), len(admin.site._registry))
+        self.assertEqual(request._admin_tools_cache['avail_models_sweeps'], 1)
+
+
+class PermissionsCacheTest(DjangoTestCase):
+    fixtures = ['users.json']
+
+    def setUp(self):
+        from admin_tools.cache import get_cache
+        get_cache().clear()
+
+    def _sweeps(self, username):
+        from django.contrib import admin
+        from django.contrib.auth.models import User
+        from django.test import RequestFactory
+        from admin_tools.utils import get_avail_models
+
+        request = RequestFactory().get('/admin/')
+        request.user = User.objects.get(username=username)
+        calls = []
+        for model_admin in admin.site._registry.values():
+            model_admin.get_model_perms = (
+                lambda request, get_perms=model_admin.get_model_perms:
+                calls.append(1) or get_perms(request)
+            )
+        try:
+            items = get_avail_models(request)
+        finally:
+            for model_admin in admin.site._registry.values():
+                del model_admin.get_model_perms
+        return len(calls) > 0, sorted(m._meta.label for m, _ in items)
+
+    def test_disabled_by_default(self):
+        self.assertTrue(self._sweeps('staff')[0])
+        self.assertTrue(self._sweeps('staff')[0])
+
+    def test_cached_across_requests(self):
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_PERMISSIONS_CACHE_TIMEOUT=60):
+            swept, models = self._sweeps('staff')
+            self.assertTrue(swept)
+            self.assertEqual(self._sweeps('staff'), (False, models))
+            # other users have their own entry
+            self.assertTrue(self._sweeps('superuser')[0])
+
+    def test_invalidated_on_permission_changes(self):
+        from django.contrib.auth.models import Group, Permission, User
+        from django.test.utils import override_settings
+
+        user = User.objects.get(username='staff')
+        permission = Permission.objects.get(codename='change_foo')
+        with override_settings(ADMIN_TOOLS_PERMISSIONS_CACHE_TIMEOUT=60):
+            self.assertNotIn('test_app.Foo', self._sweeps('staff')[1])
+
+            user.user_permissions.add(permission)
+            swept, models = self._sweeps('staff')
+            self.assertTrue(swept)
+            self.assertIn('test_app.Foo', models)
+
+            user.user_permissions.remove(permission)
+            group = Group.objects.create(name='foo editors')
+            user.groups.add(group)
+            self.assertNotIn('test_app.Foo', self._sweeps('staff')[1])
+
+            group.permissions.add(permission)
+            self.assertIn('test_app.Foo', self._sweeps('staff')[1])
+
+            group.delete()
+            self.assertNotIn('test_app.Foo', self._sweeps('staff')[1])
+
+
+class AdminURLTableTest(DjangoTestCase):
+
+    def setUp(self):
+        from admin_tools.utils import _url_tables
+        _url_tables.clear()
+
+    def _table(self):
+        from admin_tools.utils import _url_tables
+        return _url_tables[('admin', None, '/')][1]
+
+    def test_urls_are_reversed_once(self):
+        from django.contrib.auth.models import User
+        from admin_tools import utils
+
+        reversed_names = []
+
+        def reverse(name, *args, **kwargs):
+            reversed_names.append(name)
+            return original_reverse(name, *args, **kwargs)
+
+        original_reverse, utils.reverse = utils.reverse, reverse
+        try:
+            for i in range(3):
+                self.assertEqual(
+                    utils.get_admin_url('admin', 'changelist', User),
+                    '/admin/auth/user/'
+                )
+                self.assertEqual(
+                    utils.get_admin_url('admin', 'add', User),
+                    '/admin/auth/user/add/'
+                )
+                self.assertEqual(
+                    utils.get_admin_url('admin', 'app_list', User),
+                    '/admin/auth/'
+                )
+        finally:
+            utils.reverse = original_reverse
+        self.assertEqual(reversed_names, [
+            'admin:auth_user_changelist', 'admin:auth_user_add',
+            'admin:app_list',
+        ])
+
+    def test_table_follows_urlconf(self):
+        from django.contrib.auth.models import User
+        try:
+            from django.urls import clear_url_caches, set_script_prefix
+        except ImportError:
+            from django.core.urlresolvers import (
+                clear_url_caches, set_script_prefix
+            )
+        from admin_tools.utils import get_admin_url
+
+        self.assertEqual(
+            get_admin_url('admin', 'changelist', User), '/admin/auth/user/'
+        )
+        set_script_prefix('/prefix/')
+        try:
+            self.assertEqual(
+                get_admin_url('admin', 'changelist', User),
+                '/prefix/admin/auth/user/'
+            )
+        finally:
+            set_script_prefix('/')
+        table = self._table()
+        clear_url_caches()
+        self.assertEqual(
+            get_admin_url('admin', 'changelist', User), '/admin/auth/user/'
+        )
+        self.assertIsNot(self._table(), table)
+
+
+class AdminSiteIndexTest(DjangoTestCase):
+    fixtures = ['users.json']
+    sites = (
+        ('django.contrib.admin.site', 'admin.dashboards.Default'),
+        ('test_app.admin.other_site', 'other.dashboards.Default'),
+    )
+
+    def _request(self, path):
+        from django.test import RequestFactory
+        return RequestFactory().get(path)
+
+    def test_longest_prefix_wins(self):
+        from collections import OrderedDict
+        from django.test.utils import override_settings
+        from admin_tools.utils import get_admin_site
+        from test_app.admin import other_site
+
+        for sites in (self.sites, self.sites[::-1]):
+            with override_settings(ADMIN_TOOLS_INDEX_DASHBOARD=OrderedDict(
+                sites
+            )):
+                self.assertIs(
+                    get_admin_site(request=self._request('/admin/other/')),
+                    other_site
+                )
+                self.assertEqual(
+                    get_admin_site(request=self._request('/admin/')).name,
+                    'admin'
+                )
+
+    def test_resolved_once_per_request(self):
+        from django.test.utils import override_settings
+        from admin_tools import utils
+
+        request = self._request('/admin/other/test_app/')
+        with override_settings(ADMIN_TOOLS_INDEX_DASHBOARD=dict(self.sites)):
+            entry = utils.get_admin_site_entry(request)
+            self.assertEqual(entry.index_dashboard, 'other.dashboards.Default')
+            self.assertEqual(entry.prefix, '/admin/other/')
+            entries = utils.get_admin_site_entries
+            utils.get_admin_site_entries = None
+            try:
+                self.assertIs(utils.get_admin_site_entry(request), entry)
+                self.assertEqual(
+                    utils.get_admin_site(request=request).name, 'other'
+                )
+            finally:
+                utils.get_admin_site_entries = entries
+
+    def test_not_found(self):
+        from django.test.utils import override_settings
+        from admin_tools.utils import get_admin_site
+
+        with override_settings(ADMIN_TOOLS_INDEX_DASHBOARD=dict(
+            self.sites[1:]
+        )):
+            self.assertRaises(
+                ValueError, get_admin_site, request=self._request('/admin/')
+            )
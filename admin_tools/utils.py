@@ -1,15 +1,24 @@
 """
 Admin ui common utilities.
 """
-from fnmatch import fnmatch
+from bisect import bisect_left
+from fnmatch import translate
+import os
+import re
 
 import django
 from django.conf import settings
 from django.contrib import admin
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 try:
-    from django.urls import reverse
+    from django.urls import (
+        NoReverseMatch, get_resolver, get_script_prefix, get_urlconf, reverse
+    )
 except ImportError:
-    from django.core.urlresolvers import reverse
+    from django.core.urlresolvers import (
+        NoReverseMatch, get_resolver, get_script_prefix, get_urlconf, reverse
+    )
 try:
     from importlib import import_module
 except ImportError:
@@ -17,6 +26,8 @@ except ImportError:
     from django.utils.importlib import import_module
 import warnings
 
+from admin_tools.cache import get_cache, get_permissions_version, make_key
+
 
 def is_xhr(request):
     if django.VERSION < (2, 2):
@@ -35,6 +46,133 @@ def uniquify(value, seen_values):
     return new_value
 
 
+_class_cache = {}
+
+
+def import_class(path):
+    """
+    Returns the object (class, admin site instance...) designated by the
+    dotted ``path``. The module is imported and the object looked up only
+    the first time a given path is requested.
+    """
+    try:
+        return _class_cache[path]
+    except KeyError:
+        pass
+    mod, inst = path.rsplit('.', 1)
+    obj = _class_cache[path] = getattr(import_module(mod), inst)
+    return obj
+
+
+class AdminSiteEntry(object):
+    """
+    An admin site configured in the ``ADMIN_TOOLS_INDEX_DASHBOARD``,
+    ``ADMIN_TOOLS_APP_INDEX_DASHBOARD`` or ``ADMIN_TOOLS_MENU`` dicts, with
+    the dotted paths of the classes configured for it.
+    """
+
+    def __init__(self, path, admin_site, prefix):
+        self.path = path
+        self.admin_site = admin_site
+        self.prefix = prefix
+        self.index_dashboard = None
+        self.app_index_dashboard = None
+        self.menu = None
+
+
+_SITE_SETTINGS = (
+    ('index_dashboard', 'ADMIN_TOOLS_INDEX_DASHBOARD'),
+    ('app_index_dashboard', 'ADMIN_TOOLS_APP_INDEX_DASHBOARD'),
+    ('menu', 'ADMIN_TOOLS_MENU'),
+)
+
+_site_indexes = {}
+
+
+def _get_resolver_cache(store, *key):
+    """
+    Returns a dict stored in ``store`` under ``key`` for the current
+    URLconf and script prefix, the dict is emptied when the URL resolver
+    changes (url caches cleared or ``ROOT_URLCONF`` changed).
+    """
+    urlconf = get_urlconf()
+    resolver = get_resolver(urlconf)
+    key = key + (urlconf, get_script_prefix())
+    cache = store.get(key)
+    if cache is None or cache[0] is not resolver:
+        cache = store[key] = (resolver, {})
+    return cache[1]
+
+
+def get_admin_site_entries():
+    """
+    Returns the ``AdminSiteEntry`` list for the admin sites configured in
+    the admin tools settings dicts, longest URL prefix first. The list is
+    built once per URLconf. Admin sites that are not mounted in the URLconf
+    are left out with a warning.
+    """
+    cache = _get_resolver_cache(_site_indexes)
+    if 'entries' not in cache:
+        entries = {}
+        unmounted = set()
+        for attr, setting in _SITE_SETTINGS:
+            value = getattr(settings, setting, None)
+            if not isinstance(value, dict):
+                continue
+            for path, cls_path in value.items():
+                if path in unmounted:
+                    continue
+                if path not in entries:
+                    admin_site = import_class(path)
+                    try:
+                        prefix = reverse('%s:index' % admin_site.name)
+                    except NoReverseMatch:
+                        warnings.warn(
+                            'The admin site "%s" configured in %s is not '
+                            'mounted in the URLconf.' % (path, setting),
+                            RuntimeWarning
+                        )
+                        unmounted.add(path)
+                        continue
+                    entries[path] = AdminSiteEntry(path, admin_site, prefix)
+                setattr(entries[path], attr, cls_path)
+        cache['entries'] = sorted(
+            entries.values(), key=lambda e: len(e.prefix), reverse=True
+        )
+    return cache['entries']
+
+
+def get_admin_site_entry(request, attr='index_dashboard'):
+    """
+    Returns the ``AdminSiteEntry`` of the admin site serving ``request``
+    among the sites defining ``attr`` (``index_dashboard``,
+    ``app_index_dashboard`` or ``menu``), or ``None``. The result is
+    memoized for the duration of the request.
+
+    The site is matched against ``request.path``, or against the path
+    stored under the ``'path'`` key of the request cache by views that
+    render admin pages fragments.
+    """
+    cache = get_request_cache(request)
+    key = ('admin_site_entry', attr)
+    if key not in cache:
+        cache[key] = None
+        path = cache.get('path', request.path)
+        for entry in get_admin_site_entries():
+            if getattr(entry, attr) is not None and \
+                    path.startswith(entry.prefix):
+                cache[key] = entry
+                break
+    return cache[key]
+
+
+@receiver(setting_changed)
+def _clear_caches(setting, **kwargs):
+    _class_cache.clear()
+    if setting in [name for attr, name in _SITE_SETTINGS]:
+        _site_indexes.clear()
+
+
 def get_admin_site(context=None, request=None):
     dashboard_cls = getattr(
         settings,
@@ -45,14 +183,9 @@ def get_admin_site(context=None, request=None):
     if isinstance(dashboard_cls, dict):
         if context:
             request = context.get('request')
-        curr_url = request.path
-        for key in dashboard_cls:
-            mod, inst = key.rsplit('.', 1)
-            mod = import_module(mod)
-            admin_site = getattr(mod, inst)
-            admin_url = reverse('%s:index' % admin_site.name)
-            if curr_url.startswith(admin_url):
-                return admin_site
+        entry = get_admin_site_entry(request, 'index_dashboard')
+        if entry is not None:
+            return entry.admin_site
     else:
         return admin.site
     raise ValueError('Admin site matching "%s" not found' % dashboard_cls)
@@ -62,11 +195,142 @@ def get_admin_site_name(context):
     return get_admin_site(context).name
 
 
+def get_request_cache(request):
+    """
+    Returns a dict attached to ``request`` that is used to memoize admin
+    tools computations for the duration of the request.
+    """
+    try:
+        return request._admin_tools_cache
+    except AttributeError:
+        cache = request._admin_tools_cache = {}
+        return cache
+
+
+def _get_user_state_key(user_pk):
+    return make_key('user_state', user_pk)
+
+
+def _get_user_state_timeout():
+    return getattr(
+        settings, 'ADMIN_TOOLS_USER_STATE_CACHE_TIMEOUT',
+        getattr(settings, 'ADMIN_TOOLS_PREFERENCES_CACHE_TIMEOUT', None)
+    )
+
+
+def _load_user_state(user):
+    from django.apps import apps
+
+    state = {'bookmarks': [], 'preferences': {}}
+    if user.pk is None:
+        return state
+    if apps.is_installed('admin_tools.menu'):
+        from admin_tools.menu.models import Bookmark
+
+        state['bookmarks'] = list(Bookmark.objects.filter(
+            user=user
+        ).values_list('id', 'title', 'url'))
+    if apps.is_installed('admin_tools.dashboard'):
+        from admin_tools.dashboard.models import DashboardPreferences
+
+        state['preferences'] = dict(DashboardPreferences.objects.filter(
+            user=user
+        ).values_list('dashboard_id', 'data'))
+    return state
+
+
+def get_user_state(request):
+    """
+    Returns the admin tools state of the current user, a dict with:
+
+    ``bookmarks``
+        The list of ``(id, title, url)`` tuples of the user bookmarks.
+
+    ``preferences``
+        A dict mapping dashboard ids to the user preferences.
+
+    The state is loaded once per request (with one query per installed
+    admin tools app) and shared by the menu and dashboard tags. If the
+    ``ADMIN_TOOLS_USER_STATE_CACHE_TIMEOUT`` setting is set, it is stored
+    in a single cache entry per user.
+    """
+    request_cache = get_request_cache(request)
+    if 'user_state' in request_cache:
+        return request_cache['user_state']
+    user = request.user
+    timeout = _get_user_state_timeout()
+    state = None
+    if timeout and user.pk is not None:
+        key = _get_user_state_key(user.pk)
+        state = get_cache().get(key)
+        if state is None:
+            state = _load_user_state(user)
+            get_cache().set(key, state, timeout)
+    if state is None:
+        state = _load_user_state(user)
+    request_cache['user_state'] = state
+    return state
+
+
+def invalidate_user_state(user_pk):
+    """
+    Deletes the cached admin tools state of the user ``user_pk``, this must
+    be called when its bookmarks or dashboard preferences change.
+    """
+    get_cache().delete(_get_user_state_key(user_pk))
+
+
 def get_avail_models(request):
-    """ Returns (model, perm,) for all models user can possibly see """
-    items = []
+    """
+    Returns (model, perm,) for all models user can possibly see.
+    The permissions sweep runs once per request and admin site, every
+    ``AppList`` and ``ModelList`` of the menu and the dashboard share it.
+    """
     admin_site = get_admin_site(request=request)
+    cache = get_request_cache(request)
+    key = ('avail_models', admin_site.name)
+    if key not in cache:
+        cache[key] = _get_avail_models(request, admin_site)
+        # exposed so that tests can check the number of sweeps
+        cache['avail_models_sweeps'] = cache.get('avail_models_sweeps', 0) + 1
+    return cache[key]
+
+
+def _get_avail_models(request, admin_site):
+    timeout = getattr(settings, 'ADMIN_TOOLS_PERMISSIONS_CACHE_TIMEOUT', None)
+    user = getattr(request, 'user', None)
+    if not timeout or user is None or not user.is_authenticated:
+        return _sweep_avail_models(request, admin_site)
+
+    cache = get_cache()
+    key = make_key(
+        'avail_models',
+        admin_site.name,
+        len(admin_site._registry),
+        user.pk,
+        get_permissions_version(user),
+    )
+    cached = cache.get(key)
+    if cached is not None:
+        # models are cached by label and looked up in the registry again
+        registry = dict(
+            (model._meta.label_lower, model) for model in admin_site._registry
+        )
+        return [
+            (registry[label], perms) for label, perms in cached
+            if label in registry
+        ]
+    items = _sweep_avail_models(request, admin_site)
+    cache.set(
+        key,
+        [(model._meta.label_lower, perms) for model, perms in items],
+        timeout
+    )
+    return items
 
+
+def _sweep_avail_models(request, admin_site):
+    items = []
     for model, model_admin in admin_site._registry.items():
         perms = model_admin.get_model_perms(request)
         if True not in perms.values():
@@ -75,56 +339,147 @@ def get_avail_models(request):
     return items
 
 
+def _full_name(model):
+    return '%s.%s' % (model.__module__, model.__name__)
+
+
+class ModelMatcher(object):
+    """
+    Compiled form of a pair of ``models``/``exclude`` pattern lists.
+
+    Patterns are compiled once: patterns without wildcards become exact
+    lookups, wildcard patterns are translated to regular expressions and
+    restricted to the models sharing their literal prefix, and all exclude
+    patterns are merged into a single regular expression. Filtering a list
+    of ``(model, perms)`` items is thus roughly linear in the number of
+    items instead of quadratic.
+    """
+    wildcard_re = re.compile(r'[*?[]')
+
+    def __init__(self, models, exclude):
+        self.patterns = []
+        for pattern in models:
+            pattern = os.path.normcase(pattern)
+            wildcard = self.wildcard_re.search(pattern)
+            if wildcard is None:
+                self.patterns.append((pattern, None))
+            else:
+                self.patterns.append((
+                    pattern[:wildcard.start()],
+                    re.compile(translate(pattern)).match
+                ))
+        self.exclude = None
+        if exclude:
+            self.exclude = re.compile('|'.join(
+                '(?:%s)' % translate(os.path.normcase(pattern))
+                for pattern in exclude
+            )).match
+
+    def filter(self, items):
+        """
+        Returns the items matching the compiled patterns, in the same order
+        ``filter_models`` always used: for each pattern, exact matches first
+        (in registry order) then wildcard matches sorted alphabetically.
+        """
+        names = [os.path.normcase(_full_name(model)) for model, _ in items]
+        if not self.patterns:
+            included = list(items)
+        else:
+            exact = {}
+            for index, name in enumerate(names):
+                exact.setdefault(name, []).append(index)
+            ordered = sorted(zip(names, range(len(names))))
+            included = []
+            for prefix, match in self.patterns:
+                if match is None:
+                    included.extend(items[i] for i in exact.get(prefix, ()))
+                    continue
+                # models sharing the literal prefix of the pattern form a
+                # contiguous range of the sorted names
+                indexes = []
+                position = bisect_left(ordered, (prefix,))
+                while position < len(ordered):
+                    name, index = ordered[position]
+                    if not name.startswith(prefix):
+                        break
+                    if match(name):
+                        indexes.append(index)
+                    position += 1
+                # keep registry order before sorting alphabetically, the
+                # sort is stable
+                wildcard_models = [items[i] for i in sorted(indexes)]
+                wildcard_models.sort(
+                    key=lambda x: x[0]._meta.verbose_name_plural
+                )
+                included += wildcard_models
+
+        if self.exclude is None:
+            return included
+        exclude = self.exclude
+        return [
+            item for item in included
+            if not exclude(os.path.normcase(_full_name(item[0])))
+        ]
+
+
+_matcher_cache = {}
+
+
+def get_model_matcher(models, exclude):
+    """
+    Returns the ``ModelMatcher`` for the given patterns, compiling it only
+    the first time a given ``(models, exclude)`` pair is seen.
+    """
+    key = (tuple(models), tuple(exclude))
+    try:
+        return _matcher_cache[key]
+    except KeyError:
+        matcher = _matcher_cache[key] = ModelMatcher(*key)
+        return matcher
+
+
 def filter_models(request, models, exclude):
     """
     Returns (model, perm,) for all models that match models/exclude patterns
     and are visible by current user.
     """
     items = get_avail_models(request)
-    included = []
+    return get_model_matcher(models, exclude).filter(items)
 
-    def full_name(model):
-        return '%s.%s' % (model.__module__, model.__name__)
 
-    # I believe that that implemented
-    # O(len(patterns)*len(matched_patterns)*len(all_models))
-    # algorithm is fine for model lists because they are small and admin
-    # performance is not a bottleneck. If it is not the case then the code
-    # should be optimized.
+_url_tables = {}
 
-    if len(models) == 0:
-        included = items
-    else:
-        for pattern in models:
-            wildcard_models = []
-            for item in items:
-                model, perms = item
-                model_str = full_name(model)
-                if model_str == pattern:
-                    # exact match
-                    included.append(item)
-                elif fnmatch(model_str, pattern) and \
-                        item not in wildcard_models:
-                    # wildcard match, put item in separate list so it can be
-                    # sorted alphabetically later
-                    wildcard_models.append(item)
-            if wildcard_models:
-                # sort wildcard matches alphabetically before adding them
-                wildcard_models.sort(
-                    key=lambda x: x[0]._meta.verbose_name_plural
-                )
-                included += wildcard_models
 
-    result = included[:]
-    for pattern in exclude:
-        for item in included:
-            model, perms = item
-            if fnmatch(full_name(model), pattern):
-                try:
-                    result.remove(item)
-                except ValueError:  # if the item was already removed skip
-                    pass
-    return result
+def get_admin_url(site_name, kind, model=None):
+    """
+    Returns the ``kind`` ('index', 'changelist', 'add' or 'app_list') admin
+    URL of ``model`` for the admin site named ``site_name``.
+
+    URLs are reversed once and then served from a per admin site table, the
+    table is dropped when the URLconf changes (the url resolvers caches are
+    cleared or another URLconf or script prefix is in use).
+    """
+    table = _get_resolver_cache(_url_tables, site_name)
+    if kind == 'index':
+        key = (kind,)
+    elif kind == 'app_list':
+        key = (kind, model._meta.app_label)
+    else:
+        key = (kind, model)
+    try:
+        return table[key]
+    except KeyError:
+        pass
+    if kind == 'index':
+        url = reverse('%s:index' % site_name)
+    elif kind == 'app_list':
+        url = reverse('%s:app_list' % site_name, args=key[1:])
+    else:
+        url = reverse('%s:%s_%s_%s' % (
+            site_name, model._meta.app_label, model.__name__.lower(), kind
+        ))
+    table[key] = url
+    return url
 
 
 class AppListElementMixin(object):
@@ -166,24 +521,18 @@ class AppListElementMixin(object):
         """
         Returns the admin change url.
         """
-        app_label = model._meta.app_label
-        return reverse('%s:app_list' % get_admin_site_name(context),
-                       args=(app_label,))
+        return get_admin_url(get_admin_site_name(context), 'app_list', model)
 
     def _get_admin_change_url(self, model, context):
         """
         Returns the admin change url.
         """
-        app_label = model._meta.app_label
-        return reverse('%s:%s_%s_changelist' % (get_admin_site_name(context),
-                                                app_label,
-                                                model.__name__.lower()))
+        return get_admin_url(
+            get_admin_site_name(context), 'changelist', model
+        )
 
     def _get_admin_add_url(self, model, context):
         """
         Returns the admin add url.
         """
-        app_label = model._meta.app_label
-        return reverse('%s:%s_%s_add' % (get_admin_site_name(context),
-                                         app_label,
-                                         model.__name__.lower()))
+        return get_admin_url(get_admin_site_name(context), 'add', model)
@@ -61,7 +61,7 @@ class CustomIndexDashboard(Dashboard):
 
         # append a recent actions module
         self.children.append(
-             modules.RecentActions(_('Recent Actions'), 5)
+             modules.RecentActions(_('Recent Actions'), 5, lazy=True)
         )
 
         # append another link list module for "support".
@@ -106,6 +106,15 @@ class CustomIndexDashboard(Dashboard):
         pass
 
 
+class OtherIndexDashboard(Dashboard):
+    """
+    Index dashboard for the test_app.admin.other_site admin site.
+    """
+    def __init__(self, **kwargs):
+        Dashboard.__init__(self, **kwargs)
+        self.children.append(modules.AppList(_('Applications')))
+
+
 # to activate your app index dashboard add the following to your settings.py:
 #
 # ADMIN_TOOLS_APP_INDEX_DASHBOARD = 'test_proj.dashboard.CustomAppIndexDashboard'
@@ -131,3 +140,18 @@ class CustomAppIndexDashboard(AppIndexDashboard):
         Use this method if you need to access the request context.
         """
         pass
+
+
+class StaticIndexDashboard(Dashboard):
+    """
+    Index dashboard whose modules cannot be moved, it does not need jQuery
+    UI.
+    """
+
+    def __init__(self, **kwargs):
+        Dashboard.__init__(self, **kwargs)
+        self.children.append(modules.LinkList(
+            _('Quick links'),
+            draggable=False,
+            children=[[_('Return to site'), '/']],
+        ))
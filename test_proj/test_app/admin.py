@@ -2,4 +2,11 @@ from django.contrib import admin
 from test_app.models import Foo, Bar
 
 admin.site.register(Foo)
-admin.site.register(Bar)
\ No newline at end of file
+admin.site.register(Bar)
+
+# a second admin site, used to test multiple admin sites support
+other_site = admin.AdminSite(name='other')
+other_site.register(Foo)
+
+# an admin site that is not mounted in the URLconf
+unmounted_site = admin.AdminSite(name='unmounted')
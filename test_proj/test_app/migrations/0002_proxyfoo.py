@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProxyFoo',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+            },
+            bases=('test_app.foo',),
+        ),
+    ]
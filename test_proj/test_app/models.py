@@ -4,4 +4,9 @@ class Foo(models.Model):
     pass
 
 class Bar(models.Model):
-    pass
\ No newline at end of file
+    pass
+
+
+class ProxyFoo(Foo):
+    class Meta:
+        proxy = True
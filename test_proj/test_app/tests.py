@@ -1,7 +1,7 @@
 import sys
 import json
 
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.contrib.auth.models import User
 try:
     from django.urls import reverse
@@ -62,6 +62,38 @@ class AdminBasicTest(TestCase):
         self.client.logout()
         self.client.logout()
 
+    def test_single_permissions_sweep(self):
+        # menu and dashboard app lists share a single permissions sweep
+        self._login('superuser', '123')
+        response = self.client.get('/admin/')
+        cache = response.wsgi_request._admin_tools_cache
+        self.assertEqual(cache['avail_models_sweeps'], 1)
+        self.client.logout()
+
+    def test_no_imports_on_second_request(self):
+        from admin_tools import utils
+
+        imported = []
+
+        def import_module(name, *args, **kwargs):
+            imported.append(name)
+            return original_import_module(name, *args, **kwargs)
+
+        original_import_module = utils.import_module
+        utils.import_module = import_module
+        utils._class_cache.clear()
+        try:
+            self._login('superuser', '123')
+            for url in ('/admin/', '/admin/test_app/'):
+                self.client.get(url)
+                self.assertNotEqual(imported, [])
+                del imported[:]
+                self.client.get(url)
+                self.assertEqual(imported, [])
+        finally:
+            utils.import_module = original_import_module
+        self.client.logout()
+
     def test_app_index(self):
         self._login('staff', '123')
         res = self.client.get('/admin/test_app/')
@@ -78,14 +110,14 @@ class AdminBasicTest(TestCase):
 
     def test_add_dashboard_preferences(self):
         self._login('superuser', '123')
-        pref_data = {"foo": "bar"}
+        pref_data = {"positions": ["module_1"]}
         res = self.client.post(
             reverse('admin-tools-dashboard-set-preferences', args=('test-dashboard',)),
             {'data': json.dumps(pref_data)}
         )
         self.assertEqual(res.status_code, 200)
         pref = DashboardPreferences.objects.get(dashboard_id='test-dashboard')
-        self.assertEqual(json.loads(pref.data), pref_data)
+        self.assertEqual(pref.data, pref_data)
 
     def test_edit_dashboard_preferences(self):
         try:
@@ -98,16 +130,16 @@ class AdminBasicTest(TestCase):
         pref = DashboardPreferences.objects.create(
             user=user,
             dashboard_id='test-dashboard',
-            data=json.dumps('{}')
+            data={}
         )
-        new_pref_data = {"bar": "baz"}
+        new_pref_data = {"collapsed": {"module_1": True}}
         res = self.client.post(
             reverse('admin-tools-dashboard-set-preferences', args=('test-dashboard',)),
             {'data': json.dumps(new_pref_data)}
         )
         self.assertEqual(res.status_code, 200)
         pref = DashboardPreferences.objects.get(pk=pref.pk)
-        self.assertEqual(json.loads(pref.data), new_pref_data)
+        self.assertEqual(pref.data, new_pref_data)
 
     def test_add_menu_bookmark(self):
         self._login('superuser', '123')
@@ -149,3 +181,705 @@ class AdminBasicTest(TestCase):
         with self.assertRaises(Bookmark.DoesNotExist):
             Bookmark.objects.get(pk=bm.pk)
 
+
+class MultipleAdminSitesTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def _login(self, username, password):
+        user = User.objects.get(username=username)
+        self.client.force_login(user)
+
+    def test_site_dashboard_and_menu(self):
+        from django.test.utils import override_settings
+
+        with override_settings(
+            ADMIN_TOOLS_INDEX_DASHBOARD={
+                'django.contrib.admin.site':
+                    'test_proj.dashboard.CustomIndexDashboard',
+                'test_app.admin.other_site':
+                    'test_proj.dashboard.OtherIndexDashboard',
+            },
+            ADMIN_TOOLS_MENU={
+                'django.contrib.admin.site': 'test_proj.menu.CustomMenu',
+                'test_app.admin.other_site': 'admin_tools.menu.DefaultMenu',
+            },
+        ):
+            self._login('superuser', '123')
+            response = self.client.get('/admin/')
+            self.assertContains(response, 'Test app menu')
+            self.assertContains(response, '/static/test_app/dashboard.js')
+            response = self.client.get('/admin/other/')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotContains(response, 'Test app menu')
+            self.assertNotContains(response, '/static/test_app/dashboard.js')
+            self.assertContains(response, 'href="/admin/other/test_app/foo/"')
+            self.assertNotContains(response, 'href="/admin/test_app/foo/"')
+
+    def test_unmounted_site(self):
+        import warnings
+        from django.test.utils import override_settings
+
+        with override_settings(
+            ADMIN_TOOLS_MENU={
+                'django.contrib.admin.site': 'test_proj.menu.CustomMenu',
+                'test_app.admin.unmounted_site':
+                    'admin_tools.menu.DefaultMenu',
+            },
+        ):
+            self._login('superuser', '123')
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                response = self.client.get('/admin/')
+            self.assertContains(response, 'Test app menu')
+            self.assertTrue([
+                w for w in caught if 'test_app.admin.unmounted_site' in
+                str(w.message)
+            ])
+
+
+class MenuCacheTest(TransactionTestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.get(username='superuser'))
+
+    def _get_menu(self, url):
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_MENU_CACHE_TIMEOUT=60):
+            content = self.client.get(url).content.decode('utf-8')
+        return content[content.index('<ul id="navigation-menu">'):]
+
+    def test_selected_items(self):
+        from admin_tools.menu.templatetags import admin_tools_menu_tags
+
+        uncached = self.client.get('/admin/').content.decode('utf-8')
+        self.assertEqual(
+            self._get_menu('/admin/'),
+            uncached[uncached.index('<ul id="navigation-menu">'):]
+        )
+        self.assertNotIn('__admin_tools_selected_', self._get_menu('/admin/'))
+
+        calls = []
+        orig = admin_tools_menu_tags._render_navigation
+
+        def render_navigation(*args):
+            calls.append(args)
+            return orig(*args)
+
+        admin_tools_menu_tags._render_navigation = render_navigation
+        try:
+            menu = self._get_menu('/admin/test_app/')
+        finally:
+            admin_tools_menu_tags._render_navigation = orig
+        self.assertEqual(calls, [])
+        self.assertIn(
+            '<li class="menu-item selected"><a href="/admin/test_app/"', menu
+        )
+        self.assertNotIn(
+            '<li class="menu-item first selected"><a href="/admin/"', menu
+        )
+
+    def test_bookmarks_invalidation(self):
+        self.assertNotIn('Cached bookmark', self._get_menu('/admin/'))
+        bookmark = Bookmark.objects.create(
+            user=User.objects.get(username='superuser'),
+            url='/admin/test_app/', title='Cached bookmark'
+        )
+        self.assertIn('Cached bookmark', self._get_menu('/admin/'))
+        bookmark.delete()
+        self.assertNotIn('Cached bookmark', self._get_menu('/admin/'))
+
+
+class LazyModuleTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username='superuser'))
+
+    def test_lazy_module(self):
+        import re
+
+        response = self.client.get('/admin/')
+        urls = re.findall(
+            r'data-lazy-url="([^"]+)"', response.content.decode('utf-8')
+        )
+        self.assertEqual(len(urls), 1)
+        url = urls[0].replace('&amp;', '&')
+        self.assertIn('path=%2Fadmin%2F', url)
+        self.assertNotContains(response, 'No recent actions')
+
+        response = self.client.get(url)
+        self.assertContains(response, 'id="module_5"')
+        self.assertContains(response, 'No recent actions')
+        self.assertContains(response, 'dashboard-module-content')
+        self.assertNotContains(response, 'data-lazy-url')
+
+        response = self.client.get(url.replace('/5/', '/42/'))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url.replace('/dashboard/', '/other/'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_site_permission(self):
+        import re
+        from django.contrib import admin
+        try:
+            from unittest import mock
+        except ImportError:
+            import mock
+
+        response = self.client.get('/admin/')
+        url = re.search(
+            r'data-lazy-url="([^"]+)"', response.content.decode('utf-8')
+        ).group(1).replace('&amp;', '&')
+        with mock.patch.object(
+                admin.site, 'has_permission', return_value=False):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncInitTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def test_async_init(self):
+        from django.test.utils import override_settings
+
+        user = User.objects.get(username='superuser')
+        self.client.force_login(user)
+        Bookmark.objects.create(user=user, url='/admin/', title='Async')
+        with override_settings(ADMIN_TOOLS_ASYNC_INIT=True):
+            response = self.client.get('/admin/')
+            self.assertContains(response, 'Async')
+            self.assertContains(response, 'href="/admin/test_app/foo/"')
+            response = self.client.get('/admin/test_app/')
+            self.assertContains(response, 'No recent actions')
+
+
+class StreamingIndexTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def test_streaming_index(self):
+        self.client.force_login(User.objects.get(username='superuser'))
+        response = self.client.get('/admin/stream/')
+        self.assertTrue(response.streaming)
+        chunks = [c.decode('utf-8') for c in response.streaming_content]
+        # the page shell comes first, with placeholders for the modules
+        self.assertIn('id="navigation-menu"', chunks[0])
+        self.assertIn('id="module_4"', chunks[0])
+        self.assertIn('<p class="loading">', chunks[0])
+        self.assertNotIn('stream_module_', chunks[0])
+        # then each module (the lazy one is not streamed)
+        self.assertEqual(len(chunks), 1 + 6 + 1)
+        self.assertIn('<div id="stream_module_4"', chunks[4])
+        self.assertIn('<h2>Test1</h2>', chunks[4])
+        self.assertIn('href="/admin/sites/site/"', chunks[4])
+        self.assertIn('data-lazy-url', chunks[0])
+        self.assertIn('</body>', chunks[-1])
+
+    def test_login_redirect(self):
+        response = self.client.get('/admin/stream/')
+        self.assertEqual(response.status_code, 302)
+
+
+class DashboardPreferencesTest(TransactionTestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client.force_login(User.objects.get(username='superuser'))
+
+    def _get_preferences_queries(self, url='/admin/'):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return [
+            q['sql'] for q in queries.captured_queries
+            if 'admin_tools_dashboard_preferences' in q['sql']
+        ]
+
+    def test_no_insert_on_render(self):
+        self.assertEqual(len(self._get_preferences_queries()), 1)
+        self.assertFalse(DashboardPreferences.objects.exists())
+
+    def test_cached_preferences(self):
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_PREFERENCES_CACHE_TIMEOUT=60):
+            self.assertEqual(len(self._get_preferences_queries()), 1)
+            self.assertEqual(self._get_preferences_queries(), [])
+            self.client.post(
+                reverse(
+                    'admin-tools-dashboard-set-preferences',
+                    args=('dashboard',)
+                ),
+                {'data': json.dumps({'collapsed': {'module_1': True}})},
+                HTTP_X_REQUESTED_WITH='XMLHttpRequest'
+            )
+            self.assertEqual(len(self._get_preferences_queries()), 1)
+            response = self.client.get('/admin/')
+            self.assertContains(response, '{"collapsed":{"module_1":true}}')
+
+    def test_prune_removed_modules(self):
+        data = {'positions': ['module_1', 'module_</script>']}
+        preferences = DashboardPreferences.objects.create(
+            user=User.objects.get(username='superuser'),
+            dashboard_id='dashboard',
+            data=data,
+        )
+        response = self.client.get('/admin/')
+        self.assertContains(response, '{"positions":["module_1"]}')
+        self.assertNotContains(response, 'module_</script>')
+        # the stored preferences are not changed by rendering
+        preferences.refresh_from_db()
+        self.assertEqual(preferences.data, data)
+
+
+class UserStateTest(TransactionTestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.get(username='superuser')
+        Bookmark.objects.create(user=self.user, url='/admin/', title='Home')
+        DashboardPreferences.objects.create(
+            user=self.user, dashboard_id='dashboard',
+            data={'collapsed': {'module_1': True}}
+        )
+        self.client.force_login(self.user)
+
+    def test_query_budget(self):
+        # session, user, bookmarks and preferences
+        with self.assertNumQueries(4):
+            response = self.client.get('/admin/')
+        self.assertContains(response, 'id="bookmark-button" class="bookmarked"')
+        self.assertContains(response, '{"collapsed":{"module_1":true}}')
+
+    def test_cached_state(self):
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_USER_STATE_CACHE_TIMEOUT=60):
+            self.client.get('/admin/')
+            with self.assertNumQueries(2):
+                self.client.get('/admin/')
+            Bookmark.objects.create(
+                user=self.user, url='/admin/auth/', title='Auth'
+            )
+            with self.assertNumQueries(4):
+                response = self.client.get('/admin/')
+        self.assertContains(response, 'href="/admin/auth/"')
+
+    def test_invalidated_on_commit(self):
+        from django.db import transaction
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_USER_STATE_CACHE_TIMEOUT=60):
+            self.client.get('/admin/')
+            with transaction.atomic():
+                DashboardPreferences.objects.get(user=self.user).save()
+                # the other requests may still cache the previous state
+                with self.assertNumQueries(2):
+                    self.client.get('/admin/')
+            with self.assertNumQueries(4):
+                self.client.get('/admin/')
+
+
+class BookmarkLookupTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='superuser')
+        self.client.force_login(self.user)
+
+    def test_normalized_url(self):
+        # the url is sent urlencoded by the bookmark form
+        self.client.post(reverse('admin-tools-menu-add-bookmark'), {
+            'url': '/admin/auth/user/%3Fo%3D1%26is_staff__exact%3D1',
+            'title': 'Staff',
+        })
+        bookmark = Bookmark.objects.get(user=self.user)
+        self.assertEqual(bookmark.url, '/admin/auth/user/?is_staff__exact=1&o=1')
+        response = self.client.get('/admin/auth/user/?is_staff__exact=1&o=1')
+        self.assertContains(response, 'class="bookmarked"')
+        response = self.client.get('/admin/auth/user/?o=1&is_staff__exact=1')
+        self.assertContains(response, 'class="bookmarked"')
+        response = self.client.get('/admin/auth/user/?o=1')
+        self.assertNotContains(response, 'class="bookmarked"')
+
+    def test_encoded_query(self):
+        # "#" and "&" in a query value are kept encoded
+        self.client.post(reverse('admin-tools-menu-add-bookmark'), {
+            'url': '/admin/auth/user/%3Fq%3D%2523x%2526y',
+            'title': 'Search',
+        })
+        bookmark = Bookmark.objects.get(user=self.user)
+        self.assertEqual(bookmark.url, '/admin/auth/user/?q=%23x%26y')
+        response = self.client.get('/admin/auth/user/?q=%23x%26y')
+        self.assertContains(response, 'class="bookmarked"')
+        response = self.client.get('/admin/auth/user/?q=')
+        self.assertNotContains(response, 'class="bookmarked"')
+
+    def test_no_lookup_query(self):
+        Bookmark.objects.create(user=self.user, url='/admin/', title='Home')
+        with self.assertNumQueries(4):
+            response = self.client.get('/admin/')
+        self.assertContains(response, 'class="bookmarked"')
+
+
+class BundleTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test.utils import override_settings
+
+        static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, static_root)
+        settings = override_settings(
+            STATIC_ROOT=static_root, ADMIN_TOOLS_BUNDLE=True
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(User.objects.get(username='superuser'))
+
+    def test_not_built(self):
+        response = self.client.get('/admin/')
+        self.assertContains(response, 'loadScripts(js_files')
+        self.assertNotContains(response, 'admin_tools/bundles/')
+
+    def test_bundle(self):
+        from io import StringIO
+        from django.contrib.staticfiles.storage import staticfiles_storage
+        from django.core.management import call_command
+        from admin_tools.bundles import get_manifest
+
+        call_command('bundle_admin_tools', stdout=StringIO())
+        manifest = get_manifest()
+        self.assertIn('admin_tools/js/dashboard.js', manifest['files'])
+        self.assertIn('test_app/dashboard.js', manifest['files'])
+        with staticfiles_storage.open(manifest['name']) as f:
+            content = f.read().decode('utf-8')
+        self.assertIn('var init_dashboard', content)
+        self.assertIn("if (typeof(jQuery) == 'undefined') {", content)
+
+        response = self.client.get('/admin/')
+        self.assertNotContains(response, 'loadScripts(js_files')
+        # the bundle is loaded once for the menu and the dashboard
+        self.assertContains(
+            response,
+            '<script type="text/javascript" src="/static/%s" defer>' % (
+                manifest['name']
+            ),
+            1
+        )
+        self.assertNotContains(response, 'test_app/dashboard.js')
+        self.assertContains(response, 'admin_tools_init_dashboard);')
+        self.assertContains(response, 'admin_tools_init_menu);')
+
+    def test_modern_bundle(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test.utils import override_settings
+        from admin_tools.bundles import get_manifest
+
+        with override_settings(ADMIN_TOOLS_ASSET_PROFILE='modern'):
+            call_command('bundle_admin_tools', stdout=StringIO())
+            self.assertNotIn(
+                'admin_tools/js/jquery/jquery-ui.min.js',
+                get_manifest()['files']
+            )
+            response = self.client.get('/admin/')
+        # the dashboard modules are draggable
+        self.assertContains(
+            response,
+            '<script type="text/javascript" src="/static/admin_tools/js/'
+            'jquery/jquery-ui.min.js" defer>'
+        )
+        # the modern bundle is not used with the legacy profile
+        response = self.client.get('/admin/')
+        self.assertContains(response, 'loadScripts(js_files')
+        self.assertNotContains(response, 'admin_tools/bundles/')
+
+
+class AssetProfileTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        self.client.force_login(User.objects.get(username='superuser'))
+
+    def _measure(self, profile):
+        """
+        Returns the number of admin tools assets that a browser loads on the
+        index page with the given profile, and their size in bytes.
+        """
+        import os
+        import re
+        from django.contrib.staticfiles import finders
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_ASSET_PROFILE=profile):
+            content = self.client.get('/admin/').content.decode('utf-8')
+        # only Internet Explorer reads conditional comments
+        content = re.sub(r'(?s)<!--\[if .*?<!\[endif\]-->', '', content)
+        assets = set(re.findall(
+            r'(?:src : \'|src="|href=")/static/'
+            r'((?:admin_tools|test_app)/[^\'"]+)', content
+        ))
+        # not loaded by browsers that implement JSON
+        assets.discard('admin_tools/js/json.min.js')
+        return len(assets), sum(
+            os.path.getsize(finders.find(asset)) for asset in assets
+        )
+
+    def test_draggable_dashboard(self):
+        legacy_requests, legacy_bytes = self._measure('legacy')
+        modern_requests, modern_bytes = self._measure('modern')
+        # jquery.cookie is not loaded
+        self.assertEqual(modern_requests, legacy_requests - 1)
+        self.assertLess(modern_bytes, legacy_bytes)
+
+    def test_static_dashboard(self):
+        from django.test.utils import override_settings
+
+        with override_settings(
+            ADMIN_TOOLS_INDEX_DASHBOARD='test_proj.dashboard.'
+                                        'StaticIndexDashboard'
+        ):
+            legacy_requests, legacy_bytes = self._measure('legacy')
+            modern_requests, modern_bytes = self._measure('modern')
+        # jquery.cookie and the jQuery UI script and stylesheet
+        self.assertEqual(modern_requests, legacy_requests - 3)
+        self.assertGreater(legacy_bytes - modern_bytes, 250000)
+
+    def test_no_ie_assets(self):
+        from django.test.utils import override_settings
+
+        with override_settings(ADMIN_TOOLS_ASSET_PROFILE='modern'):
+            response = self.client.get('/admin/')
+        self.assertNotContains(response, '[if IE')
+        self.assertNotContains(response, '[if lt IE')
+        self.assertNotContains(response, 'json.min.js')
+
+
+class MenuClientCacheTest(TransactionTestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        from django.core.cache import cache
+        from django.test.utils import override_settings
+
+        cache.clear()
+        self.user = User.objects.get(username='superuser')
+        self.client.force_login(self.user)
+        settings = override_settings(ADMIN_TOOLS_MENU_CLIENT_CACHE=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def _get_version(self, url='/admin/'):
+        import re
+
+        content = self.client.get(url).content.decode('utf-8')
+        return re.search(r'data-menu-version="(\w+)"', content).group(1)
+
+    def _count_init_menu(self):
+        from admin_tools.menu.templatetags import admin_tools_menu_tags
+
+        calls = []
+        orig = admin_tools_menu_tags._init_menu
+
+        def init_menu(*args):
+            calls.append(args)
+            return orig(*args)
+
+        admin_tools_menu_tags._init_menu = init_menu
+        self.addCleanup(setattr, admin_tools_menu_tags, '_init_menu', orig)
+        return calls
+
+    def test_placeholder(self):
+        response = self.client.get('/admin/')
+        self.assertContains(response, 'data-menu-url="/admin_tools/menu/menu/')
+        self.assertContains(response, 'load_menu(')
+        self.assertNotContains(response, '<li class="menu-item')
+        # the current page bookmark form is still rendered
+        self.assertContains(response, 'id="bookmark-form"')
+
+        calls = self._count_init_menu()
+        self.client.get('/admin/test_app/')
+        self.assertEqual(calls, [])
+
+    def test_admin_site_permission(self):
+        from django.contrib import admin
+        try:
+            from unittest import mock
+        except ImportError:
+            import mock
+
+        url = reverse('admin-tools-menu') + '?path=/admin/'
+        with mock.patch.object(
+                admin.site, 'has_permission', return_value=False):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_menu_view(self):
+        version = self._get_version()
+        url = reverse('admin-tools-menu') + '?path=/admin/'
+        response = self.client.get(url)
+        self.assertEqual(response['ETag'], '"%s"' % version)
+        self.assertIn('private', response['Cache-Control'])
+        menu = json.loads(response.content.decode('utf-8'))
+        self.assertEqual(menu['version'], version)
+        self.assertIn('<ul id="navigation-menu">', menu['html'])
+        self.assertIn('__admin_tools_selected_', menu['html'])
+        self.assertTrue(any('/admin/' in urls for urls in menu['selection']))
+
+        # hydrated like the menu javascript does
+        import re
+        from django.test.utils import override_settings
+
+        html = re.sub(
+            r'__admin_tools_selected_(\d+)__',
+            lambda m: ' selected' if '/admin/' in menu['selection'][
+                int(m.group(1))] else '',
+            menu['html']
+        )
+        with override_settings(ADMIN_TOOLS_MENU_CLIENT_CACHE=False):
+            self.assertContains(self.client.get('/admin/'), html, html=True)
+
+        calls = self._count_init_menu()
+        response = self.client.get(
+            url, HTTP_IF_NONE_MATCH='"%s"' % version
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(calls, [])
+
+    def test_bookmark_changes_version(self):
+        version = self._get_version()
+        Bookmark.objects.create(user=self.user, url='/admin/', title='Home')
+        self.assertNotEqual(self._get_version(), version)
+
+    def test_login_required(self):
+        self.client.logout()
+        response = self.client.get(reverse('admin-tools-menu'))
+        self.assertEqual(response.status_code, 302)
+
+
+class PatchPreferencesTest(TestCase):
+
+    fixtures = ['users.json']
+
+    def setUp(self):
+        self.user = User.objects.get(username='superuser')
+        self.client.force_login(self.user)
+        self.url = reverse(
+            'admin-tools-dashboard-patch-preferences', args=('dashboard',)
+        )
+
+    def _patch(self, patch):
+        return self.client.post(self.url, {'patch': json.dumps(patch)})
+
+    def _get_data(self):
+        return DashboardPreferences.objects.get(
+            user=self.user, dashboard_id='dashboard'
+        ).data
+
+    def test_patch(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self._patch({'positions': ['module_2', 'module_1']})
+        self.assertEqual(self._get_data(), {
+            'positions': ['module_2', 'module_1']
+        })
+        self._patch({'collapsed': {'module_1': True}})
+        with CaptureQueriesContext(connection) as queries:
+            response = self._patch({
+                'collapsed': {'module_2': True},
+                'disabled': {'module_1': True},
+                'columns': [1, 1],
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_data(), {
+            'positions': ['module_2', 'module_1'],
+            'collapsed': {'module_1': True, 'module_2': True},
+            'disabled': {'module_1': True},
+            'columns': [1, 1],
+        })
+        self.assertEqual(len([
+            q for q in queries.captured_queries
+            if q['sql'].startswith('UPDATE "admin_tools_dashboard')
+        ]), 1)
+
+    def test_first_patch(self):
+        # the first patch of a fresh dashboard, the javascript initializes
+        # the categories that were never set with empty objects
+        response = self._patch({
+            'positions': {},
+            'columns': {},
+            'disabled': {},
+            'collapsed': {'module_1': True},
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_data(), {
+            'collapsed': {'module_1': True}
+        })
+
+    def test_invalid_patch(self):
+        for patch in (['module_1'], {'foo': 1}, {'columns': ['a']},
+                      {'collapsed': {'module_1': 'yes'}}):
+            self.assertEqual(self._patch(patch).status_code, 400)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertFalse(DashboardPreferences.objects.exists())
+
+    def test_oversized_patch(self):
+        response = self._patch({'positions': ['module_1'] * 2000})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DashboardPreferences.objects.exists())
+
+    def test_prune_removed_modules(self):
+        stale = dict(('module_%d' % i, True) for i in range(10, 1010))
+        DashboardPreferences.objects.create(
+            user=self.user, dashboard_id='dashboard',
+            data={'positions': ['module_1', 'module_10'], 'collapsed': stale}
+        )
+        self.assertGreater(len(json.dumps(self._get_data())), 16000)
+        patch = json.dumps({'collapsed': {'module_1': True, 'module_9': True}})
+        # without the displayed modules, the preferences would be too large
+        response = self.client.post(self.url, {'patch': patch})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.url, {
+            'patch': patch,
+            'modules': json.dumps(['module_1', 'module_2', 'module_10']),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_data(), {
+            'positions': ['module_1', 'module_10'],
+            'collapsed': {'module_1': True, 'module_10': True},
+        })
+
+    def test_invalid_modules(self):
+        patch = json.dumps({'collapsed': {'module_1': True}})
+        for modules in ('module_1', '["module_1", 1]', '["foo"]', '{}'):
+            response = self.client.post(
+                self.url, {'patch': patch, 'modules': modules}
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(DashboardPreferences.objects.exists())
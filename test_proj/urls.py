@@ -11,7 +11,12 @@ from django.views.static import serve
 
 admin.autodiscover()
 
+from test_app.admin import other_site
+from admin_tools.dashboard.views import streaming_index
+
 urlpatterns = [
+    url(r'^admin/stream/$', streaming_index),
+    url(r'^admin/other/', other_site.urls),
     url(r'^admin/', admin.site.urls),
     url(r'^admin_tools/', include('admin_tools.urls')),
     url(r'^static/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),